@@ -42,7 +42,21 @@ DATA_CONFIG = {
     'HANDLE_MISSING_VALUES': True,
     'NORMALIZE_CATEGORIES': True,
     'USE_SPARSE_MATRIX': True,  # 大型数据集使用稀疏矩阵
-    'CHUNK_SIZE': 10000  # 大数据集分块处理
+    'CHUNK_SIZE': 10000,  # 大数据集分块处理
+    'REQUIRED_COLUMNS': [  # 分析实际用到的列，读取时按此裁剪
+        "wish_create_time",
+        "intention_payment_time",
+        "deposit_payment_time",
+        "lock_time",
+        "final_payment_time",
+        "delivery_date",
+        "order_create_time",
+        "order_status",
+        "series",
+        "province_name",
+        "big_channel_name",
+        "hold_reason"
+    ]
 }
 
 # 输出配置
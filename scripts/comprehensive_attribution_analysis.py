@@ -10,13 +10,305 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from pathlib import Path
+import heapq
+import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DATA_CONFIG
+
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS']
 plt.rcParams['axes.unicode_minus'] = False
 
+# numba 可选：装了就把计数内核 JIT 成机器码，没装退回纯 NumPy 实现
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 基准分解缓存：同一批路径在多次分析/重复运行间复用因式分解结果
+_FACTOR_CACHE = {}
+
+# 状态数达到该阈值后改用稀疏矩阵 + splu（阶段×类别展开时转移矩阵高度稀疏）
+_SPARSE_STATE_THRESHOLD = 200
+
+# 定义阶段
+STAGE_COLS = [
+    ("wish_create_time", "Wish"),
+    ("intention_payment_time", "Intention"),
+    ("deposit_payment_time", "Deposit"),
+    ("lock_time", "Lock"),
+    ("final_payment_time", "Final"),
+    ("delivery_date", "Delivery"),
+]
+
+
+class _MarkovFactor:
+    """吸收链的基准分解结果（稠密存基本矩阵 N，稀疏存 splu 因子）"""
+
+    __slots__ = ("states", "idx", "T", "trans", "trans_pos",
+                 "trans_ids", "absorb_ids", "Q", "R", "N", "lu", "v", "w",
+                 "baseline")
+
+    def __init__(self, **kw):
+        for name, value in kw.items():
+            setattr(self, name, value)
+
+
+class PathStore:
+    """路径的 SoA 存储：扁平 int32 节点编号 + CSR 偏移数组
+
+    字符串状态只在 states 中保留一份，后续计算全部使用整数编号，
+    内存从每个节点一个 Python 字符串降到 4 字节。
+    """
+
+    __slots__ = ("nodes", "offsets", "states", "idx")
+
+    def __init__(self, nodes, offsets, states, idx):
+        self.nodes = nodes        # 所有路径首尾相接的节点编号
+        self.offsets = offsets    # 第 i 条路径为 nodes[offsets[i]:offsets[i+1]]
+        self.states = states      # 编号 -> 状态名
+        self.idx = idx            # 状态名 -> 编号
+
+
+def _count_transitions(src, dst, valid, n):
+    """按边统计转移次数，返回 n×n 稠密计数矩阵"""
+    return np.bincount(src[valid] * n + dst[valid],
+                       minlength=n * n).reshape(n, n).astype(np.float64)
+
+
+if NUMBA_AVAILABLE:
+    @numba.njit(cache=True)
+    def _count_transitions(src, dst, valid, n):  # noqa: F811
+        T = np.zeros((n, n))
+        for i in range(len(src)):
+            if valid[i]:
+                T[src[i], dst[i]] += 1.0
+        return T
+
+
+def _factor_paths(store):
+    """构建转移矩阵并分解基准吸收链，按路径内容缓存最近一份，返回 _MarkovFactor
+
+    键必须同时覆盖编号序列和状态表：编号相同而状态表不同的两个维度
+    不能共享分解结果。只保留单份，长跑进程不会按数据集累积 N/R 矩阵
+    """
+    key = (store.nodes.tobytes(), tuple(store.states))
+    entry = _FACTOR_CACHE.get("entry")
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    states = store.states
+    idx = store.idx
+    n = len(states)
+
+    # 相邻编号即为边，屏蔽跨路径的边
+    src = store.nodes[:-1].astype(np.int64)
+    dst = store.nodes[1:].astype(np.int64)
+    valid = np.ones(len(src), dtype=bool)
+    valid[store.offsets[1:-1] - 1] = False
+
+    # 吸收/瞬态编号在 build_paths 插入时即已确定，这里直接按编号切分，
+    # 不再对状态表做 set/sorted 扫描
+    absorb_ids = np.array([idx["Conversion"], idx["Null"]])
+    trans_ids = np.setdiff1d(np.arange(n), absorb_ids, assume_unique=True)
+    trans = [states[i] for i in trans_ids]
+    trans_pos = {s: i for i, s in enumerate(trans)}
+    v = np.zeros(len(trans))
+    v[trans_pos["Start"]] = 1
+
+    if n >= _SPARSE_STATE_THRESHOLD:
+        # 稀疏分支：CSR 转移矩阵 + splu，求逆的 O(n³)/O(n²) 开销降到近似 nnz 线性
+        ones = np.ones(int(valid.sum()))
+        T = sparse.coo_matrix((ones, (src[valid], dst[valid])), shape=(n, n)).tocsr()
+        row_sum = np.asarray(T.sum(axis=1)).ravel()
+        scale = np.divide(1.0, row_sum, out=np.zeros_like(row_sum), where=row_sum != 0)
+        T = sparse.diags(scale) @ T
+        Q = T[trans_ids][:, trans_ids].tocsr()
+        R = T[trans_ids][:, absorb_ids].toarray()
+        lu = splu(sparse.eye(len(trans), format='csc') - Q.tocsc())
+        # 只需要 Start 行：解 (I-Q)^T w = v 一次即得 v@N
+        w = lu.solve(v, trans='T')
+        baseline = (w @ R)[0]
+        N = None
+    else:
+        # 稠密分支：计数内核（numba JIT 或 bincount）后整矩阵求逆
+        T = _count_transitions(src, dst, valid, n)
+        row_sum = T.sum(1, keepdims=True)
+        T = np.divide(T, row_sum, out=np.zeros_like(T), where=row_sum != 0)
+        Q = T[np.ix_(trans_ids, trans_ids)]
+        R = T[np.ix_(trans_ids, absorb_ids)]
+        N = np.linalg.inv(np.eye(len(Q)) - Q)
+        lu = None
+        w = v @ N
+        baseline = (w @ R)[0]
+
+    result = _MarkovFactor(states=states, idx=idx, T=T, trans=trans,
+                           trans_pos=trans_pos, trans_ids=trans_ids,
+                           absorb_ids=absorb_ids, Q=Q, R=R, N=N, lu=lu,
+                           v=v, w=w, baseline=baseline)
+    _FACTOR_CACHE["entry"] = (key, result)
+    return result
+
+
+# 构建路径（按列向量化，直接产出 PathStore 的 int32 SoA 布局）
+def _build_paths(df, category_col):
+    col = df[category_col]
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("category")
+    cat_names = col.cat.categories.to_numpy().astype(str)
+    codes = col.cat.codes.to_numpy()
+    if (codes < 0).any():
+        cat_names = np.append(cat_names, "nan")
+        codes = np.where(codes < 0, len(cat_names) - 1, codes)
+    delivered = df["delivery_date"].notna().to_numpy()
+    # 每个阶段列只做一次 notna 扫描；标签只按 类别×阶段 拼一张表，
+    # 行内循环用 (类别编码, 阶段号) 查表，不再做逐格字符串格式化
+    present = [df[col_name].notna().to_numpy() for col_name, _ in STAGE_COLS]
+    stage_names = np.array([stage for _, stage in STAGE_COLS])
+    label_table = np.char.add(np.char.add(stage_names[None, :], "_"),
+                              cat_names[:, None])
+    stages = range(len(STAGE_COLS))
+
+    idx = {}
+    states = []
+
+    def intern(s):
+        i = idx.get(s)
+        if i is None:
+            i = len(states)
+            idx[s] = i
+            states.append(str(s))
+        return i
+
+    start_id = intern("Start")
+    conv_id = intern("Conversion")
+    null_id = intern("Null")
+
+    # 标签编号也按表缓存，每个 类别×阶段 组合只 intern 一次
+    id_table = np.full(label_table.shape, -1, dtype=np.int32)
+    nodes = []
+    offsets = [0]
+    for i in range(len(df)):
+        nodes.append(start_id)
+        c = codes[i]
+        for j in stages:
+            if present[j][i]:
+                nid = id_table[c, j]
+                if nid < 0:
+                    nid = intern(label_table[c, j])
+                    id_table[c, j] = nid
+                nodes.append(nid)
+        nodes.append(conv_id if delivered[i] else null_id)
+        offsets.append(len(nodes))
+    return PathStore(np.asarray(nodes, dtype=np.int32),
+                     np.asarray(offsets, dtype=np.int32),
+                     states, idx)
+
+
+# 计算移除效应（Woodbury 低秩修正，基准分解经 _factor_paths 缓存复用）
+def _removal_effect_woodbury(store, test_nodes):
+    f = _factor_paths(store)
+    Q, R, v, baseline = f.Q, f.R, f.v, f.baseline
+    k_t = len(f.trans)
+    is_sparse = f.lu is not None
+
+    def q_col(k):
+        if is_sparse:
+            return np.asarray(Q.getcol(k).todense()).ravel()
+        return Q[:, k]
+
+    def q_row(i):
+        if is_sparse:
+            return np.asarray(Q.getrow(i).todense()).ravel()
+        return Q[i].copy()
+
+    def full_recompute(node):
+        """退化情形回退：整体重建转移矩阵再求逆"""
+        # 清零和重归一化融合在同一块缓冲里：行和由减法得到，除法原地写回，
+        # 不再额外分配求和列与目标矩阵（行和为 0 的行此时已全零，跳过除法即可）
+        Ti = f.T.toarray() if is_sparse else f.T.copy()
+        ki = f.idx[node]
+        new_sum = Ti.sum(1) - Ti[:, ki]
+        Ti[:, ki] = 0
+        Ti[ki, :] = 0
+        np.divide(Ti, new_sum[:, None], out=Ti, where=new_sum[:, None] != 0)
+        Q2 = Ti[np.ix_(f.trans_ids, f.trans_ids)]
+        R2 = Ti[np.ix_(f.trans_ids, f.absorb_ids)]
+        N2 = np.linalg.inv(np.eye(len(Q2)) - Q2)
+        return (v @ N2 @ R2)[0]
+
+    results = []
+    for node in test_nodes:
+        if node not in f.trans_pos:
+            continue
+        k = f.trans_pos[node]
+        # 移除节点 k 只改动两类行：k 行本身（清零）和指向 k 的行（重新归一化），
+        # 即 (I - Q) 的一个秩 m 扰动（m = 受影响行数，链式结构下很小）
+        rows = np.flatnonzero(q_col(k))
+        if k not in rows:
+            rows = np.append(rows, k)
+        dQ = np.zeros((len(rows), k_t))
+        dR = np.zeros((len(rows), R.shape[1]))
+        for m_i, i in enumerate(rows):
+            qi = q_row(i)
+            if i == k:
+                dQ[m_i] = -qi
+                dR[m_i] = -R[k]
+                continue
+            s = 1.0 - qi[k]
+            if s > 0:
+                new_q = qi.copy()
+                new_q[k] = 0.0
+                dQ[m_i] = new_q / s - qi
+                dR[m_i] = R[i] / s - R[i]
+            else:
+                dQ[m_i] = -qi
+                dR[m_i] = -R[i]
+
+        # (I - Q') = (I - Q) - U·dQ，其中 U 的列为受影响行的单位向量；
+        # v @ N 已在分解时求好（f.w），每个节点只剩秩 m 修正的向量运算
+        try:
+            if is_sparse:
+                U = np.zeros((k_t, len(rows)))
+                U[rows, np.arange(len(rows))] = 1.0
+                Nu = f.lu.solve(U)                       # N @ U
+                dQN = f.lu.solve(dQ.T, trans='T').T      # dQ @ N
+            else:
+                Nu = f.N[:, rows]
+                dQN = dQ @ f.N
+            M = np.eye(len(rows)) - dQ @ Nu              # I - dQ·N·U
+            corr = np.linalg.solve(M, dQN)
+            w2 = f.w + f.w[rows] @ corr                  # v @ (I - Q')^-1
+            new_conv = (w2 @ R + w2[rows] @ dR)[0]
+        except np.linalg.LinAlgError:
+            new_conv = full_recompute(node)
+
+        results.append((node, round((baseline - new_conv) * 100, 2)))
+    return results
+
+
+def _analyze_dim(df, category_col, test_nodes):
+    """单个维度的完整归因：建路径 -> 基准分解 -> 移除效应（进程池工作函数）
+
+    路径只在本函数作用域内存活：移除效应算完立即释放，串行回退时
+    峰值内存也只有一份路径集，不会三个维度同时驻留。
+    """
+    store = _build_paths(df, category_col)
+    results = _removal_effect_woodbury(store, test_nodes)
+    del store
+    return results
+
+
 class VehicleAttributionAnalysis:
     def __init__(self, data_file):
         """初始化分析器"""
@@ -24,37 +316,79 @@ class VehicleAttributionAnalysis:
         self.df = None
         self.analysis_results = {}
         
+    def _parquet_cache_path(self):
+        """清洗结果的 Parquet 缓存路径，按源文件 mtime 区分；pyarrow 不可用时返回 None
+
+        文件名带管线标识：与 optimized 管线的清洗口径不同（category 列、
+        UNKNOWN 兜底），共用缓存会互相读坏对方的数据
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return None
+        if not os.path.exists(self.data_file):
+            return None
+        mtime = int(os.path.getmtime(self.data_file))
+        return f".cache/{Path(self.data_file).stem}_{mtime}_comprehensive.parquet"
+
+    @staticmethod
+    def _filter_jump_orders(df):
+        """过滤跳跃式订单（后一阶段有值而前一阶段为空）"""
+        # notna 掩码一次性取成 NumPy 数组再按位或，避免链式表达式的多个中间 Series
+        jump_cols = ["intention_payment_time", "deposit_payment_time",
+                     "lock_time", "final_payment_time", "delivery_date"]
+        present = np.stack([df[c].notna().to_numpy() for c in jump_cols])
+        jump = (
+            (present[1] & ~present[0]) | (present[2] & ~present[1]) |
+            (present[3] & ~present[2]) | (present[4] & ~present[3])
+        )
+        return df.iloc[~jump].copy()
+
     def load_and_clean_data(self):
         """加载和清洗数据"""
         print("📊 正在加载数据...")
+
+        # openpyxl 解析 xlsx 很慢，清洗结果落盘为 Parquet 后重复运行直接复用
+        cache_file = self._parquet_cache_path()
+        if cache_file and os.path.exists(cache_file):
+            print(f"使用Parquet缓存: {cache_file}")
+            self.df = pd.read_parquet(cache_file)
+            return self.df
+
         self.df = pd.read_excel(self.data_file, engine="openpyxl")
         print(f"原始数据形状: {self.df.shape}")
-        
+
         # 数据清洗 - 方案B：移除跳跃式订单
-        jump = (
-            (self.df["deposit_payment_time"].notna() & self.df["intention_payment_time"].isna()) |
-            (self.df["lock_time"].notna() & self.df["deposit_payment_time"].isna()) |
-            (self.df["final_payment_time"].notna() & self.df["lock_time"].isna()) |
-            (self.df["delivery_date"].notna() & self.df["final_payment_time"].isna())
-        )
-        self.df = self.df[~jump]
+        # read_excel 已整表驻留，分块过滤降不了峰值内存，反而多出逐块
+        # 拷贝和 concat；整表一次布尔掩码过滤即可
+        self.df = self._filter_jump_orders(self.df)
         print(f"清洗后数据形状: {self.df.shape}")
-        
-        # 添加渠道分类
-        def categorize_channel(channel):
-            if channel == "门店":
-                return "STORE"
-            elif channel == "总部":
-                return "HQ"
-            else:
-                return "OTHER"
-        
-        self.df["channel_category"] = self.df["big_channel_name"].map(categorize_channel).fillna("OTHER")
-        
+
+        # 字符串列转 categorical：value_counts/groupby 走整数编码路径，内存也随之下降
+        for col in ["big_channel_name", "province_name", "series", "order_status"]:
+            if col in self.df.columns:
+                self.df[col] = self.df[col].astype("category")
+
+        # 添加渠道分类：字典 map 走 C 层哈希查找，不再逐行调用 Python 函数
+        channel_mapping = {"门店": "STORE", "总部": "HQ"}
+        self.df["channel_category"] = (
+            self.df["big_channel_name"].map(channel_mapping).fillna("OTHER").astype("category")
+        )
+
+        if cache_file:
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                self.df.to_parquet(cache_file)
+            except Exception as e:
+                print(f"⚠️ Parquet缓存写入失败: {e}")
+
         return self.df
     
     def basic_data_exploration(self):
         """基础数据探索"""
+        if "funnel_data" in self.analysis_results:
+            return self.analysis_results["funnel_data"]
+
         print("\n🔍 基础数据探索")
         print("=" * 50)
         
@@ -98,134 +432,99 @@ class VehicleAttributionAnalysis:
     
     def markov_attribution_analysis(self):
         """马尔可夫链归因分析"""
+        if "channel_effects" in self.analysis_results:
+            return (self.analysis_results["channel_effects"],
+                    self.analysis_results["province_effects"],
+                    self.analysis_results["series_effects"])
+
         print("\n📈 马尔可夫链归因分析")
         print("=" * 50)
-        
-        # 定义阶段
-        STAGE_COLS = [
-            ("wish_create_time", "Wish"),
-            ("intention_payment_time", "Intention"),
-            ("deposit_payment_time", "Deposit"),
-            ("lock_time", "Lock"),
-            ("final_payment_time", "Final"),
-            ("delivery_date", "Delivery"),
+
+        # 先准备好三个维度的类别列与候选节点
+        top_provinces = self.df["province_name"].value_counts().head(8).index.tolist()
+        # isin 走 C 层哈希集合，替代逐行 lambda + 列表线性查找
+        prov = self.df["province_name"].cat.add_categories(["UNKNOWN"]).fillna("UNKNOWN")
+        self.df["province_cat"] = pd.Categorical(
+            np.where(prov.isin(top_provinces), prov, "OTHER")
+        )
+
+        top_series = self.df["series"].value_counts().head(8).index.tolist()
+        ser = self.df["series"].cat.add_categories(["UNKNOWN"]).fillna("UNKNOWN")
+        self.df["series_cat"] = pd.Categorical(
+            np.where(ser.isin(top_series), ser, "OTHER")
+        )
+
+        stage_cols = [col for col, _ in STAGE_COLS]
+        dims = [
+            ("channel_effects", "channel_category",
+             [f"{stage}_{ch}" for ch in ["HQ", "STORE"] for _, stage in STAGE_COLS[1:]]),
+            ("province_effects", "province_cat",
+             [f"{stage}_{p}" for p in top_provinces for _, stage in STAGE_COLS[1:]]),
+            ("series_effects", "series_cat",
+             [f"{stage}_{s}" for s in top_series for _, stage in STAGE_COLS[1:]]),
         ]
-        
-        # 构建路径
-        def build_paths(df, category_col):
-            def row_path(row):
-                path = ["Start"]
-                category = row[category_col]
-                for col, stage in STAGE_COLS:
-                    if pd.notna(row[col]):
-                        path.append(f"{stage}_{category}")
-                path.append("Conversion" if pd.notna(row["delivery_date"]) else "Null")
-                return path
-            
-            return df.apply(row_path, axis=1).tolist()
-        
-        # 计算移除效应
-        def removal_effect(paths, test_nodes):
-            states = sorted({s for p in paths for s in p})
-            idx = {s: i for i, s in enumerate(states)}
-            n = len(states)
-            
-            # 转移矩阵
-            T = np.zeros((n, n))
-            for p in paths:
-                for a, b in zip(p[:-1], p[1:]):
-                    T[idx[a], idx[b]] += 1
-            row_sum = T.sum(1, keepdims=True)
-            T = np.divide(T, row_sum, out=np.zeros_like(T), where=row_sum != 0)
-            
-            # 基准转化概率
-            absorb = ["Conversion", "Null"]
-            trans = [s for s in states if s not in absorb]
-            Q = T[np.ix_([idx[s] for s in trans], [idx[s] for s in trans])]
-            R = T[np.ix_([idx[s] for s in trans], [idx[s] for s in absorb])]
-            N = np.linalg.inv(np.eye(len(Q)) - Q)
-            v = np.zeros(len(trans))
-            v[trans.index("Start")] = 1
-            baseline = (v @ N @ R)[0]
-            
-            results = []
-            for node in test_nodes:
-                if node not in idx:
-                    continue
-                Ti = T.copy()
-                Ti[:, idx[node]] = 0
-                Ti[idx[node], :] = 0
-                rs = Ti.sum(1, keepdims=True)
-                Ti = np.divide(Ti, rs, out=np.zeros_like(Ti), where=rs != 0)
-                
-                Q2 = Ti[np.ix_([idx[s] for s in trans], [idx[s] for s in trans])]
-                R2 = Ti[np.ix_([idx[s] for s in trans], [idx[s] for s in absorb])]
-                N2 = np.linalg.inv(np.eye(len(Q2)) - Q2)
-                new_conv = (v @ N2 @ R2)[0]
-                
-                results.append((node, round((baseline - new_conv) * 100, 2)))
-            return results
-        
+
+        # 三个维度相互独立且都是计算密集型，多核机器上用进程池并行；
+        # 只把 阶段列+类别列 的最小切片发给子进程，控制序列化成本
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=3) as ex:
+                futures = {
+                    key: ex.submit(_analyze_dim, self.df[stage_cols + [col]], col, nodes)
+                    for key, col, nodes in dims
+                }
+                effects = {key: fut.result() for key, fut in futures.items()}
+        except Exception as e:
+            print(f"⚠️ 并行分析失败，回退到串行: {e}")
+            effects = {key: _analyze_dim(self.df[stage_cols + [col]], col, nodes)
+                       for key, col, nodes in dims}
+
+        channel_effects = effects["channel_effects"]
+        province_effects = effects["province_effects"]
+        series_effects = effects["series_effects"]
+
         # 渠道分析
         print("渠道归因分析:")
-        paths_channel = build_paths(self.df, "channel_category")
-        channel_nodes = [f"{stage}_{ch}" for ch in ["HQ", "STORE"] for _, stage in STAGE_COLS[1:]]
-        channel_effects = removal_effect(paths_channel, channel_nodes)
-        
         for node, effect in sorted(channel_effects, key=lambda x: -x[1]):
             print(f"  {node:<20}: {effect:+.2f} pp")
-        
-        # 省份分析
+
+        # 省份分析（只展示前 10，nlargest 为 O(n log 10)，不整表排序）
         print("\n省份归因分析 (Top 8):")
-        top_provinces = self.df["province_name"].value_counts().head(8).index.tolist()
-        self.df["province_cat"] = self.df["province_name"].fillna("UNKNOWN").apply(
-            lambda x: x if x in top_provinces else "OTHER"
-        )
-        
-        paths_province = build_paths(self.df, "province_cat")
-        province_nodes = [f"{stage}_{prov}" for prov in top_provinces for _, stage in STAGE_COLS[1:]]
-        province_effects = removal_effect(paths_province, province_nodes)
-        
-        for node, effect in sorted(province_effects, key=lambda x: -x[1])[:10]:
+        for node, effect in heapq.nlargest(10, province_effects, key=lambda x: x[1]):
             print(f"  {node:<20}: {effect:+.2f} pp")
-        
+
         # 车系分析
         print("\n车系归因分析 (Top 8):")
-        top_series = self.df["series"].value_counts().head(8).index.tolist()
-        self.df["series_cat"] = self.df["series"].fillna("UNKNOWN").apply(
-            lambda x: x if x in top_series else "OTHER"
-        )
-        
-        paths_series = build_paths(self.df, "series_cat")
-        series_nodes = [f"{stage}_{series}" for series in top_series for _, stage in STAGE_COLS[1:]]
-        series_effects = removal_effect(paths_series, series_nodes)
-        
-        for node, effect in sorted(series_effects, key=lambda x: -x[1])[:10]:
+        for node, effect in heapq.nlargest(10, series_effects, key=lambda x: x[1]):
             print(f"  {node:<20}: {effect:+.2f} pp")
-        
+
         self.analysis_results["channel_effects"] = channel_effects
         self.analysis_results["province_effects"] = province_effects
         self.analysis_results["series_effects"] = series_effects
-        
+
         return channel_effects, province_effects, series_effects
     
     def time_series_analysis(self):
         """时间序列分析"""
+        if "monthly_orders" in self.analysis_results:
+            return (self.analysis_results["monthly_orders"],
+                    self.analysis_results["monthly_conversion"])
+
         print("\n⏰ 时间序列分析")
         print("=" * 50)
-        
-        # 按月统计订单量
+
+        # 按月统计订单量：月份只解析一次，两个聚合复用同一个 grouper
         self.df["order_month"] = pd.to_datetime(self.df["order_create_time"]).dt.to_period('M')
-        monthly_orders = self.df.groupby("order_month").size()
-        
+        self.df["_delivered"] = self.df["delivery_date"].notna()
+        monthly = self.df.groupby("order_month")
+        monthly_orders = monthly.size()
+
         print("月度订单量趋势:")
         for month, count in monthly_orders.tail(6).items():
             print(f"  {month}: {count:,} 订单")
-        
-        # 转化率时间趋势
-        monthly_conversion = self.df.groupby("order_month").apply(
-            lambda x: x["delivery_date"].notna().sum() / len(x) * 100
-        )
+
+        # 转化率时间趋势：布尔列求均值即为转化率，单次扫描且无 Python 回调
+        monthly_conversion = monthly["_delivered"].mean() * 100
         
         print("\n月度转化率趋势:")
         for month, rate in monthly_conversion.tail(6).items():
@@ -238,6 +537,9 @@ class VehicleAttributionAnalysis:
     
     def cancellation_analysis(self):
         """退订分析"""
+        if "refund_stats" in self.analysis_results:
+            return self.analysis_results["refund_stats"]
+
         print("\n❌ 退订分析")
         print("=" * 50)
         
@@ -304,66 +606,71 @@ class VehicleAttributionAnalysis:
         
         return summary
     
+    @staticmethod
+    def _effects_frame(effects, category_name):
+        """(节点, 效应) 列表转成结果表；rpartition 向量化拆出阶段与类别"""
+        nodes = np.asarray([node for node, _ in effects], dtype=str)
+        values = np.asarray([effect for _, effect in effects], dtype=np.float32)
+        if nodes.size:
+            parts = np.char.rpartition(nodes, "_")
+            categories, stages = parts[:, 2], parts[:, 0]
+        else:
+            categories = stages = nodes
+        return pd.DataFrame({category_name: categories, "Stage": stages,
+                             "Removal_Effect_pp": values})
+
     def save_results(self):
         """保存分析结果"""
         print("\n💾 保存分析结果...")
-        
+
         # 保存渠道分析结果
         if "channel_effects" in self.analysis_results:
-            channel_df = pd.DataFrame([
-                {"Channel": node.split("_")[-1], "Stage": "_".join(node.split("_")[:-1]), 
-                 "Removal_Effect_pp": effect} 
-                for node, effect in self.analysis_results["channel_effects"]
-            ])
+            channel_df = self._effects_frame(
+                self.analysis_results["channel_effects"], "Channel")
             channel_df.to_csv("data/channel_removal_effects.csv", index=False)
             print("✓ 渠道分析结果已保存到 data/channel_removal_effects.csv")
-        
+
         # 保存省份分析结果
         if "province_effects" in self.analysis_results:
-            province_df = pd.DataFrame([
-                {"Province": node.split("_")[-1], "Stage": "_".join(node.split("_")[:-1]), 
-                 "Removal_Effect_pp": effect} 
-                for node, effect in self.analysis_results["province_effects"]
-            ])
+            province_df = self._effects_frame(
+                self.analysis_results["province_effects"], "Province")
             province_df.to_csv("data/province_removal_effects.csv", index=False)
             print("✓ 省份分析结果已保存到 data/province_removal_effects.csv")
-        
+
         # 保存车系分析结果
         if "series_effects" in self.analysis_results:
-            series_df = pd.DataFrame([
-                {"Series": node.split("_")[-1], "Stage": "_".join(node.split("_")[:-1]), 
-                 "Removal_Effect_pp": effect} 
-                for node, effect in self.analysis_results["series_effects"]
-            ])
+            series_df = self._effects_frame(
+                self.analysis_results["series_effects"], "Series")
             series_df.to_csv("data/series_removal_effects.csv", index=False)
             print("✓ 车系分析结果已保存到 data/series_removal_effects.csv")
     
-    def run_full_analysis(self):
-        """运行完整分析"""
+    # 可按需选择的分析阶段，按声明顺序执行
+    PHASES = {
+        "exploration": basic_data_exploration,
+        "markov": markov_attribution_analysis,
+        "time_series": time_series_analysis,
+        "cancellation": cancellation_analysis,
+    }
+
+    def run_full_analysis(self, phases=None):
+        """运行完整分析；phases 指定时只跑所选阶段（结果有缓存，重复调用不重算）"""
         print("🚀 开始整车订单归因分析")
         print("=" * 60)
-        
+
         # 1. 加载和清洗数据
         self.load_and_clean_data()
-        
-        # 2. 基础数据探索
-        self.basic_data_exploration()
-        
-        # 3. 马尔可夫链归因分析
-        self.markov_attribution_analysis()
-        
-        # 4. 时间序列分析
-        self.time_series_analysis()
-        
-        # 5. 退订分析
-        self.cancellation_analysis()
-        
-        # 6. 生成总结报告
+
+        # 2. 按需执行各分析阶段
+        for name, phase in self.PHASES.items():
+            if phases is None or name in phases:
+                phase(self)
+
+        # 3. 生成总结报告
         summary = self.generate_summary_report()
-        
-        # 7. 保存结果
+
+        # 4. 保存结果
         self.save_results()
-        
+
         print("\n✅ 分析完成！")
         return summary
 
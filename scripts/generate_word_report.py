@@ -23,9 +23,14 @@ HEADING_MAP = {
     4: ("Heading 3", 14)
 }
 
+# 逐行解析的正则只编译一次，避免每行走 re 缓存查找
+_HEADING_RE = re.compile(r'^(#+) (.*)')
+_OLIST_RE = re.compile(r'^[0-9]+\. ')
+_IMAGE_RE = re.compile(r'!\[.*?\]\((.*?)\)')
+
 # 处理图片引用
 def add_image(doc, md_line):
-    match = re.search(r'!\[.*?\]\((.*?)\)', md_line)
+    match = _IMAGE_RE.search(md_line)
     if match:
         img_path = match.group(1)
         # 兼容相对路径
@@ -49,34 +54,41 @@ def md_to_docx(md_file, docx_file):
 
     for line in lines:
         line = line.rstrip('\n')
-        if not line.strip():
+        stripped = line.strip()
+        if not stripped:
             doc.add_paragraph("")
             continue
+        # 先按首字符分发，只有对应行类型才进正则
+        c = stripped[0]
         # 标题
-        heading_match = re.match(r'^(#+) (.*)', line)
-        if heading_match:
-            level = len(heading_match.group(1))
-            text = heading_match.group(2)
-            if level in HEADING_MAP:
-                style, size = HEADING_MAP[level]
-                p = doc.add_paragraph(text, style=style)
-                p.runs[0].font.size = Pt(size)
-            else:
-                doc.add_paragraph(text)
-            continue
+        if c == '#':
+            heading_match = _HEADING_RE.match(line)
+            if heading_match:
+                level = len(heading_match.group(1))
+                text = heading_match.group(2)
+                if level in HEADING_MAP:
+                    style, size = HEADING_MAP[level]
+                    p = doc.add_paragraph(text, style=style)
+                    p.runs[0].font.size = Pt(size)
+                else:
+                    doc.add_paragraph(text)
+                continue
         # 图片
-        if line.strip().startswith('!['):
-            add_image(doc, line)
-            continue
+        elif c == '!':
+            if stripped.startswith('!['):
+                add_image(doc, line)
+                continue
         # 列表
-        if line.strip().startswith('- '):
-            doc.add_paragraph(line.strip()[2:], style='List Bullet')
-            continue
-        if re.match(r'^[0-9]+\. ', line.strip()):
-            doc.add_paragraph(line.strip(), style='List Number')
-            continue
+        elif c == '-':
+            if stripped.startswith('- '):
+                doc.add_paragraph(stripped[2:], style='List Bullet')
+                continue
+        elif c.isdigit():
+            if _OLIST_RE.match(stripped):
+                doc.add_paragraph(stripped, style='List Number')
+                continue
         # 普通正文
-        doc.add_paragraph(line.strip())
+        doc.add_paragraph(stripped)
 
     doc.save(docx_file)
     print(f"✅ Word报告已生成: {docx_file}")
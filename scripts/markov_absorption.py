@@ -1,7 +1,36 @@
 # markov_absorbing.py
-import pandas as pd, numpy as np
+import pandas as pd, numpy as np, os
+from scipy.linalg import lu_factor, lu_solve
 
 FILE = "/Users/bowen/Downloads/整车订单状态指标表.xlsx"
+
+def load_orders(file, usecols):
+    """openpyxl 解析 xlsx 很慢；首次读取后整表转存 Parquet，之后走列式加载。
+    缓存存完整表，三个 markov 脚本共用同一份，usecols 只在读取时裁剪，
+    交替运行不会互相作废缓存"""
+    pq = os.path.splitext(file)[0] + ".parquet"
+    try:
+        if os.path.exists(pq) and os.path.getmtime(pq) >= os.path.getmtime(file):
+            return pd.read_parquet(pq, columns=usecols)
+    except Exception:
+        pass
+    try:
+        # calamine（Rust 实现）解析 xlsx 比 openpyxl 快一个量级，装了就优先用
+        df = pd.read_excel(file, engine="calamine")
+    except ImportError:
+        df = pd.read_excel(file, engine="openpyxl")
+    # 时间列按命名约定整表解析，缓存里其他脚本要用的列类型同样正确
+    for c in df.columns:
+        if c.endswith(("_time", "_date")):
+            try:
+                df[c] = pd.to_datetime(df[c])
+            except (ValueError, TypeError):
+                pass             # 与 parse_dates 一致：解析不动就保持原样
+    try:
+        df.to_parquet(pq)
+    except Exception:
+        pass                     # 缺 pyarrow 或目录只读时放弃缓存
+    return df[usecols]
 STAGES = [("wish_create_time","Wish"),
           ("intention_payment_time","Intention"),
           ("deposit_payment_time","Deposit"),
@@ -10,35 +39,53 @@ STAGES = [("wish_create_time","Wish"),
           ("delivery_date","Delivery")]
 
 print("⏳ loading …")
-df = pd.read_excel(FILE, engine="openpyxl")
+df = load_orders(FILE, [col for col, _ in STAGES])
+
+# 六个阶段列的 notna 掩码只算一次，清洗过滤和构径共用同一份布尔矩阵。
+# 有效订单的 notna 模式必须“前缀单调”（后一阶段有值则前一阶段必有值），
+# 布尔矩阵上的一次比较即可，免去四组 notna/isna 临时 Series
+mask = df[[col for col, _ in STAGES]].notna().to_numpy()
+keep = np.all(mask[:, 2:] <= mask[:, 1:-1], axis=1)
+df = df[keep]
+mask = mask[keep]
+
+# 向量化构径：行内按布尔掩码取阶段名，不再经过 df.apply 的逐行 Python 调用。
+# 路径采用 SoA 存储：扁平 int32 编号数组 + 偏移数组，字符串只在 states 留一份
+delivered = mask[:, -1]          # 最后一个阶段列即 delivery_date
 
-invalid = (
-    (df["deposit_payment_time"].notna()  & df["intention_payment_time"].isna()) |
-    (df["lock_time"].notna()             & df["deposit_payment_time"].isna())   |
-    (df["final_payment_time"].notna()    & df["lock_time"].isna())             |
-    (df["delivery_date"].notna()         & df["final_payment_time"].isna())
-)
-df = df[~invalid]
+idx = {}
+states = []
+def intern(s):
+    i = idx.get(s)
+    if i is None:
+        i = len(states); idx[s] = i; states.append(s)
+    return i
 
-def to_path(r):
-    p = ["Start"]
-    for col, name in STAGES:
-        if pd.notna(r[col]): p.append(name)
-    p.append("Conversion" if pd.notna(r["delivery_date"]) else "Null")
-    return p
+start_id = intern("Start")
+conv_id  = intern("Conversion")
+null_id  = intern("Null")
+stage_ids = [intern(name) for _, name in STAGES]
 
-paths = df.apply(to_path, axis=1).tolist()
-print("✔ paths:", len(paths))
+state_ids = []
+offsets = [0]
+for i in range(len(df)):
+    state_ids.append(start_id)
+    for j in np.flatnonzero(mask[i]):
+        state_ids.append(stage_ids[j])
+    state_ids.append(conv_id if delivered[i] else null_id)
+    offsets.append(len(state_ids))
+state_ids = np.asarray(state_ids, dtype=np.int32)
+offsets   = np.asarray(offsets, dtype=np.int32)
+print("✔ paths:", len(offsets) - 1)
 
 # ---------- transition matrix ----------
-states = sorted({s for p in paths for s in p})
-idx = {s:i for i,s in enumerate(states)}
+# 相邻编号即为边，屏蔽跨路径的边后用 bincount 一次性计数
 n = len(states)
-T = np.zeros((n,n))
-
-for p in paths:
-    for a,b in zip(p[:-1], p[1:]):
-        T[idx[a], idx[b]] += 1
+src = state_ids[:-1].astype(np.int64)
+dst = state_ids[1:]
+valid = np.ones(len(src), dtype=bool)
+valid[offsets[1:-1] - 1] = False
+T = np.bincount(src[valid]*n + dst[valid], minlength=n*n).reshape(n, n).astype(np.float64)
 T = T / T.sum(1, keepdims=True, where=T.sum(1,keepdims=True)!=0)
 
 # ---------- helper to compute final conv prob ----------
@@ -48,23 +95,69 @@ def conv_prob(mat):
     trans  = [s for s in states if s not in absorb]
     Q = mat[np.ix_([idx[s] for s in trans], [idx[s] for s in trans])]
     R = mat[np.ix_([idx[s] for s in trans], [idx[s] for s in absorb])]
-    N = np.linalg.inv(np.eye(len(Q)) - Q)         # Fundamental matrix
+    # 只需要 N @ R，LU 分解直接解线性系统，省掉显式求逆的 O(n³) 回代
+    lu, piv = lu_factor(np.eye(len(Q)) - Q)
+    NR = lu_solve((lu, piv), R)
     start_vec = np.zeros(len(trans)); start_vec[trans.index("Start")] = 1
-    conv_prob = start_vec @ N @ R                 # [p_to_Conv, p_to_Null]
+    conv_prob = start_vec @ NR                    # [p_to_Conv, p_to_Null]
     return conv_prob[0]                           # probability to Conversion
 
-baseline = conv_prob(T)
+# ---------- 基准分解只算一次，所有候选节点复用 ----------
+absorb = ["Conversion","Null"]
+trans  = [s for s in states if s not in absorb]
+trans_ids  = [idx[s] for s in trans]
+absorb_ids = [idx[s] for s in absorb]
+Q = T[np.ix_(trans_ids, trans_ids)]
+R = T[np.ix_(trans_ids, absorb_ids)]
+lu, piv = lu_factor(np.eye(len(Q)) - Q)
+N = lu_solve((lu, piv), np.eye(len(Q)))
+v = np.zeros(len(trans)); v[trans.index("Start")] = 1
+w = v @ N
+baseline = (w @ R)[0]
+trans_pos = {s:i for i,s in enumerate(trans)}
+
+def removed_conv(node):
+    """移除 node 后的转化率：对缓存的 N/w 做秩 m Woodbury 修正，不重新分解"""
+    k = trans_pos[node]
+    rows = np.flatnonzero(Q[:, k])
+    if k not in rows:
+        rows = np.append(rows, k)
+    dQ = np.zeros((len(rows), len(trans)))
+    dR = np.zeros((len(rows), R.shape[1]))
+    for m_i, i in enumerate(rows):
+        qi = Q[i]
+        if i == k:
+            dQ[m_i] = -qi
+            dR[m_i] = -R[k]
+            continue
+        s = 1.0 - qi[k]
+        if s > 0:
+            new_q = qi.copy(); new_q[k] = 0.0
+            dQ[m_i] = new_q / s - qi
+            dR[m_i] = R[i] / s - R[i]
+        else:
+            dQ[m_i] = -qi
+            dR[m_i] = -R[i]
+    try:
+        M = np.eye(len(rows)) - dQ @ N[:, rows]
+        corr = np.linalg.solve(M, dQ @ N)
+        w2 = w + w[rows] @ corr
+        return (w2 @ R + w2[rows] @ dR)[0]
+    except np.linalg.LinAlgError:
+        # 退化情形回退：整体重建转移矩阵再解一次。
+        # 清零和重归一化融合在同一块缓冲里：行和由减法得到，除法原地写回，
+        # 不再额外分配求和列与目标矩阵（行和为 0 的行此时已全零，跳过除法即可）
+        Ti = T.copy()
+        ki = idx[node]
+        new_sum = Ti.sum(1) - Ti[:, ki]
+        Ti[:, ki] = 0
+        Ti[ki, :] = 0
+        np.divide(Ti, new_sum[:, None], out=Ti, where=new_sum[:, None]!=0)
+        return conv_prob(Ti)
 
 effects = {}
 for stage in [s for _,s in STAGES]:
-    Ti = T.copy()
-    # zero out row & column of this stage
-    Ti[:, idx[stage]] = 0
-    Ti[idx[stage], :] = 0
-    # re-normalize each affected row
-    row_sum = Ti.sum(1, keepdims=True)
-    Ti = np.divide(Ti, row_sum, out=np.zeros_like(Ti), where=row_sum!=0)
-    effects[stage] = round((baseline - conv_prob(Ti))*100, 2)   # 百分点
+    effects[stage] = round((baseline - removed_conv(stage))*100, 2)   # 百分点
 
 print("\n★ Removal Effect (最终转化率百分点↓)")
 for stg, eff in effects.items():
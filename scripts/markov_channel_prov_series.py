@@ -3,6 +3,28 @@
 # 依赖：pip install pandas numpy openpyxl
 # ------------------------------------------
 import pandas as pd, numpy as np, os, json
+from scipy.linalg import lu_factor, lu_solve
+
+# numba 可选：装了就把计数内核 JIT 成机器码，没装退回纯 NumPy 实现
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+def _count_transitions(src, dst, valid, n):
+    """按边统计转移次数，返回 n×n 稠密计数矩阵"""
+    return np.bincount(src[valid]*n + dst[valid],
+                       minlength=n*n).reshape(n, n).astype(np.float64)
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _count_transitions(src, dst, valid, n):  # noqa: F811
+        T = np.zeros((n, n))
+        for i in range(len(src)):
+            if valid[i]:
+                T[src[i], dst[i]] += 1.0
+        return T
 
 # === 0. 参数 ===
 FILE = "/Users/Bowen/Downloads/整车订单状态指标表.xlsx"   # ← 改成真实路径
@@ -16,49 +38,99 @@ STAGE_COLS = [
     ("delivery_date",         "Delivery"),
 ]
 
+def load_orders(file, usecols):
+    """openpyxl 解析 xlsx 很慢；首次读取后整表转存 Parquet，之后走列式加载。
+    缓存存完整表，三个 markov 脚本共用同一份，usecols 只在读取时裁剪，
+    交替运行不会互相作废缓存"""
+    pq = os.path.splitext(file)[0] + ".parquet"
+    try:
+        if os.path.exists(pq) and os.path.getmtime(pq) >= os.path.getmtime(file):
+            return pd.read_parquet(pq, columns=usecols)
+    except Exception:
+        pass
+    try:
+        # calamine（Rust 实现）解析 xlsx 比 openpyxl 快一个量级，装了就优先用
+        df = pd.read_excel(file, engine="calamine")
+    except ImportError:
+        df = pd.read_excel(file, engine="openpyxl")
+    # 时间列按命名约定整表解析，缓存里其他脚本要用的列类型同样正确
+    for c in df.columns:
+        if c.endswith(("_time", "_date")):
+            try:
+                df[c] = pd.to_datetime(df[c])
+            except (ValueError, TypeError):
+                pass             # 与 parse_dates 一致：解析不动就保持原样
+    try:
+        df.to_parquet(pq)
+    except Exception:
+        pass                     # 缺 pyarrow 或目录只读时放弃缓存
+    return df[usecols]
+
 # ---------- 1. 读数据 + 方案 B 清洗 ----------
 print("⏳  loading …")
-df = pd.read_excel(FILE, engine="openpyxl")
+df = load_orders(FILE, [col for col, _ in STAGE_COLS] + ["province_name", "series"])
 
-jump = (
-    (df["deposit_payment_time"].notna()  & df["intention_payment_time"].isna()) |
-    (df["lock_time"].notna()             & df["deposit_payment_time"].isna())   |
-    (df["final_payment_time"].notna()    & df["lock_time"].isna())              |
-    (df["delivery_date"].notna()         & df["final_payment_time"].isna())
-)
-df = df[~jump]
+# 六个阶段列的 notna 掩码只算一次，清洗过滤和两次构径共用同一份布尔矩阵。
+# 有效订单的 notna 模式必须“前缀单调”（后一阶段有值则前一阶段必有值），
+# 布尔矩阵上的一次比较即可，免去四组 notna/isna 临时 Series
+mask = df[[col for col, _ in STAGE_COLS]].notna().to_numpy()
+keep = np.all(mask[:, 2:] <= mask[:, 1:-1], axis=1)
+df = df[keep]
+mask = mask[keep]
+delivered = mask[:, -1]          # 最后一个阶段列即 delivery_date
 
 # ---------- 2. 省份 / 系列 Top N 归类 ----------
 top_prov   = df["province_name"].value_counts().head(TOP_N).index.tolist()
 top_series = df["series"].value_counts().head(TOP_N).index.tolist()
 
-df["prov_cat"]   = df["province_name"].fillna("UNKNOWN").apply(lambda x: x if x in top_prov else "OTHER")
-df["series_cat"] = df["series"].fillna("UNKNOWN").apply(lambda x: x if x in top_series else "OTHER")
+# isin 在 C 层做哈希成员判断，免去逐行 lambda 的 O(TOP_N) 列表查找
+prov   = df["province_name"].fillna("UNKNOWN")
+series = df["series"].fillna("UNKNOWN")
+# 归类后基数只有 TOP_N+2，用 category 存 int8 编码而非逐行 Python 字符串
+df["prov_cat"]   = pd.Categorical(np.where(prov.isin(top_prov), prov, "OTHER"))
+df["series_cat"] = pd.Categorical(np.where(series.isin(top_series), series, "OTHER"))
 
-# ---------- 3. 构造路径函数 ----------
+# ---------- 3. 构造路径函数（向量化：复用清洗阶段的 notna 掩码 + 预拼标签列，免去逐行 apply） ----------
+# 路径采用 SoA 存储，返回 (state_ids, offsets, states, idx)：
+# 扁平 int32 编号数组 + 偏移数组，字符串只在 states 留一份
 def build_paths(cat_col):
-    def row_path(r):
-        path = ["Start"]
-        cat  = r[cat_col]
-        for col, stage in STAGE_COLS:
-            if pd.notna(r[col]):
-                path.append(f"{stage}_{cat}")
-        path.append("Conversion" if pd.notna(r["delivery_date"]) else "Null")
-        return path
-    return df.apply(row_path, axis=1).tolist()
+    cats = df[cat_col].to_numpy().astype(str)
+    labels = [np.char.add(f"{stage}_", cats) for _, stage in STAGE_COLS]
+
+    idx = {}
+    states = []
+    def intern(s):
+        i = idx.get(s)
+        if i is None:
+            i = len(states); idx[s] = i; states.append(str(s))
+        return i
+
+    start_id = intern("Start")
+    conv_id  = intern("Conversion")
+    null_id  = intern("Null")
+
+    state_ids = []
+    offsets = [0]
+    for i in range(len(df)):
+        state_ids.append(start_id)
+        for j in np.flatnonzero(mask[i]):
+            state_ids.append(intern(labels[j][i]))
+        state_ids.append(conv_id if delivered[i] else null_id)
+        offsets.append(len(state_ids))
+    return (np.asarray(state_ids, dtype=np.int32),
+            np.asarray(offsets, dtype=np.int32), states, idx)
 
 # ---------- 4. Markov Removal Effect ----------
 def removal_effect(paths, test_nodes):
-    # 状态集合
-    states = sorted({s for p in paths for s in p})
-    idx = {s:i for i,s in enumerate(states)}
-    n   = len(states)
-
-    # 转移矩阵
-    T = np.zeros((n,n))
-    for p in paths:
-        for a,b in zip(p[:-1], p[1:]):
-            T[idx[a], idx[b]] += 1
+    state_ids, offsets, states, idx = paths
+    n = len(states)
+
+    # 转移矩阵（相邻编号即为边，屏蔽跨路径的边后由计数内核一次性累加）
+    src = state_ids[:-1].astype(np.int64)
+    dst = state_ids[1:].astype(np.int64)
+    valid = np.ones(len(src), dtype=bool)
+    valid[offsets[1:-1] - 1] = False
+    T = _count_transitions(src, dst, valid, n)
     row_sum = T.sum(1, keepdims=True)
     T = np.divide(T, row_sum, out=np.zeros_like(T), where=row_sum!=0)
 
@@ -68,28 +140,74 @@ def removal_effect(paths, test_nodes):
     trans  = [s for s in states if s not in absorb]
     Q = T[np.ix_([idx[s] for s in trans], [idx[s] for s in trans])]
     R = T[np.ix_([idx[s] for s in trans], [idx[s] for s in absorb])]
-    N = np.linalg.inv(np.eye(len(Q)) - Q)
+    # 基准分解只做一次：LU 出基本矩阵 N 与 Start 行向量 w = v @ N
+    lu, piv = lu_factor(np.eye(len(Q)) - Q)
+    N = lu_solve((lu, piv), np.eye(len(Q)))
     v = np.zeros(len(trans)); v[trans.index("Start")] = 1
-    baseline = (v @ N @ R)[0]      # baseline conversion prob
+    w = v @ N
+    baseline = (w @ R)[0]          # baseline conversion prob
+    trans_pos = {s:i for i,s in enumerate(trans)}
+    trans_ids = [idx[s] for s in trans]
+    absorb_ids = [idx[s] for s in absorb]
 
-    results = []
-    for node in test_nodes:
-        if node not in idx:            # 该节点在路径中不存在
-            continue
+    def full_recompute(node):
+        """退化情形回退：整体重建转移矩阵再解一次。
+        清零和重归一化融合在同一块缓冲里：行和由减法得到，除法原地写回，
+        不再额外分配求和列与目标矩阵（行和为 0 的行此时已全零，跳过除法即可）"""
         Ti = T.copy()
-        Ti[:, idx[node]] = 0
-        Ti[idx[node], :] = 0
-        rs = Ti.sum(1, keepdims=True)
-        Ti = np.divide(Ti, rs, out=np.zeros_like(Ti), where=rs!=0)
-
-        # 重新计算 conv prob
-        Q2 = Ti[np.ix_([idx[s] for s in trans], [idx[s] for s in trans])]
-        R2 = Ti[np.ix_([idx[s] for s in trans], [idx[s] for s in absorb])]
-        N2 = np.linalg.inv(np.eye(len(Q2)) - Q2)
-        new_conv = (v @ N2 @ R2)[0]
-
-        results.append((node, round((baseline - new_conv)*100, 2)))   # 百分点
-    return results
+        ki = idx[node]
+        new_sum = Ti.sum(1) - Ti[:, ki]
+        Ti[:, ki] = 0
+        Ti[ki, :] = 0
+        np.divide(Ti, new_sum[:, None], out=Ti, where=new_sum[:, None]!=0)
+        Q2 = Ti[np.ix_(trans_ids, trans_ids)]
+        R2 = Ti[np.ix_(trans_ids, absorb_ids)]
+        return (v @ np.linalg.solve(np.eye(len(Q2)) - Q2, R2))[0]
+
+    def _effect_one(node):
+        k = trans_pos[node]
+        # 移除节点 k 只改动两类行：k 行本身（清零）和指向 k 的行（重新归一化），
+        # 即 (I - Q) 的秩 m 扰动，用 Woodbury 做 O(n²) 级别的增量修正
+        rows = np.flatnonzero(Q[:, k])
+        if k not in rows:
+            rows = np.append(rows, k)
+        dQ = np.zeros((len(rows), len(trans)))
+        dR = np.zeros((len(rows), R.shape[1]))
+        for m_i, i in enumerate(rows):
+            qi = Q[i]
+            if i == k:
+                dQ[m_i] = -qi
+                dR[m_i] = -R[k]
+                continue
+            s = 1.0 - qi[k]
+            if s > 0:
+                new_q = qi.copy(); new_q[k] = 0.0
+                dQ[m_i] = new_q / s - qi
+                dR[m_i] = R[i] / s - R[i]
+            else:
+                dQ[m_i] = -qi
+                dR[m_i] = -R[i]
+
+        # (I - Q') = (I - Q) - U·dQ，U 的列为受影响行的单位向量
+        try:
+            M = np.eye(len(rows)) - dQ @ N[:, rows]
+            corr = np.linalg.solve(M, dQ @ N)
+            w2 = w + w[rows] @ corr                 # v @ (I - Q')^-1
+            new_conv = (w2 @ R + w2[rows] @ dR)[0]
+        except np.linalg.LinAlgError:
+            new_conv = full_recompute(node)
+
+        return (node, round((baseline - new_conv)*100, 2))   # 百分点
+
+    # 各候选节点相互独立，Q/R/N/w 只读共享；线性代数在 LAPACK 里释放 GIL，
+    # 线程池即可吃满多核，还省去进程池的序列化开销
+    nodes = [node for node in test_nodes if node in idx]
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor() as ex:
+            return list(ex.map(_effect_one, nodes))
+    except ImportError:
+        return [_effect_one(node) for node in nodes]
 
 # ---------- 5. Province Stage Markov ----------
 paths_prov = build_paths("prov_cat")
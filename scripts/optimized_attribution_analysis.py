@@ -7,9 +7,8 @@
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, timedelta
+from operator import itemgetter
 import warnings
 import os
 import sys
@@ -19,9 +18,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import ANALYSIS_CONFIG, VISUALIZATION_CONFIG, DATA_CONFIG, OUTPUT_CONFIG
 from utils import (
-    build_optimized_paths, 
-    removal_effect_optimized, 
-    safe_category_mapping,
+    build_paths_soa,
+    removal_effect_optimized,
+    fused_removal_effect,
     validate_data_quality,
     parallel_removal_effect,
     log_analysis_progress
@@ -29,9 +28,13 @@ from utils import (
 
 warnings.filterwarnings('ignore')
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = VISUALIZATION_CONFIG['CHINESE_FONT']
-plt.rcParams['axes.unicode_minus'] = False
+# polars 可选依赖：装了就让数据面（列式加载、分组聚合）走 Rust 多线程引擎，
+# 没装保持 pandas 路径，报表边界始终是 pandas 对象
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    POLARS_AVAILABLE = False
 
 class OptimizedVehicleAttributionAnalysis:
     """优化版本的整车订单归因分析器"""
@@ -42,13 +45,78 @@ class OptimizedVehicleAttributionAnalysis:
         self.df = None
         self.analysis_results = {}
         self.validation_results = {}
-        
+        self._present = None  # (N, 6) 阶段列“有值”掩码，load_and_clean_data 填充
+        self._top_provinces = None  # Top N 省份/车系，load_and_clean_data 统计一次
+        self._top_series = None
+        self._paths_cache = {}  # (id(df), 列名) -> SoA 路径，维度重算时直接命中
+        
+    def _setup_plotting(self):
+        """按需加载绘图栈：纯分析路径不再为 matplotlib/seaborn 付导入开销"""
+        import matplotlib.pyplot as plt
+        import seaborn as sns  # noqa: F401
+
+        plt.rcParams['font.sans-serif'] = VISUALIZATION_CONFIG['CHINESE_FONT']
+        plt.rcParams['axes.unicode_minus'] = False
+        return plt
+
+    def _cache_top_categories(self):
+        """Top N 省份/车系只统计一次：nlargest 免去对长尾的整体排序，
+        串行和并行分析复用同一份结果"""
+        self._top_provinces = (
+            self.df["province_name"].value_counts(sort=False)
+            .nlargest(ANALYSIS_CONFIG['TOP_PROVINCES']).index.tolist()
+        )
+        self._top_series = (
+            self.df["series"].value_counts(sort=False)
+            .nlargest(ANALYSIS_CONFIG['TOP_SERIES']).index.tolist()
+        )
+
+    def _parquet_cache_path(self):
+        """清洗后数据的 Parquet 缓存路径；按源文件 mtime 失效，缺 pyarrow 时禁用
+
+        文件名带管线标识：两条管线的清洗口径不同（列类型、渠道兜底值），
+        不能共用同一份缓存
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return None
+        if not os.path.exists(self.data_file):
+            return None
+        mtime = int(os.path.getmtime(self.data_file))
+        stem = os.path.splitext(os.path.basename(self.data_file))[0]
+        return f".cache/{stem}_{mtime}_optimized.parquet"
+
     def load_and_clean_data(self):
         """加载和清洗数据"""
         log_analysis_progress("📊 正在加载数据...")
-        
+
         try:
-            self.df = pd.read_excel(self.data_file, engine="openpyxl")
+            # 重复运行直接读清洗结果的 Parquet 缓存，跳过 xlsx 解析和清洗
+            cache_file = self._parquet_cache_path()
+            if cache_file and os.path.exists(cache_file):
+                log_analysis_progress(f"使用Parquet缓存: {cache_file}")
+                if POLARS_AVAILABLE:
+                    self.df = pl.read_parquet(cache_file).to_pandas()
+                else:
+                    self.df = pd.read_parquet(cache_file)
+                self.validation_results = validate_data_quality(self.df)
+                ts = self.df[[col for col, _ in ANALYSIS_CONFIG['STAGE_COLS']]].to_numpy(dtype="datetime64[ns]")
+                self._present = ~np.isnat(ts)
+                self._cache_top_categories()
+                return self.df
+
+            # 时间列在读取时就解析成 datetime64，下游不再各自 pd.to_datetime 重解析；
+            # usecols 只取分析用到的列，整表宽度不再影响解析时间和内存
+            usecols = DATA_CONFIG['REQUIRED_COLUMNS']
+            date_cols = [col for col, _ in ANALYSIS_CONFIG['STAGE_COLS']] + ["order_create_time"]
+            try:
+                # calamine 引擎是 Rust 实现，大表解析远快于 openpyxl；没装则退回
+                self.df = pd.read_excel(self.data_file, engine="calamine",
+                                        usecols=usecols, parse_dates=date_cols)
+            except ImportError:
+                self.df = pd.read_excel(self.data_file, engine="openpyxl",
+                                        usecols=usecols, parse_dates=date_cols)
             log_analysis_progress(f"原始数据形状: {self.df.shape}")
             
             # 数据质量验证
@@ -58,25 +126,47 @@ class OptimizedVehicleAttributionAnalysis:
             if self.validation_results['missing_values']:
                 log_analysis_progress(f"发现缺失值: {self.validation_results['missing_values']}")
             
+            # 六个时间列一次性取成 datetime64 矩阵，isnat 只扫一遍，
+            # 免去八次 notna/isna 的整列布尔 Series 分配
+            ts = self.df[[col for col, _ in ANALYSIS_CONFIG['STAGE_COLS']]].to_numpy(dtype="datetime64[ns]")
+            present = ~np.isnat(ts)
+
             # 数据清洗 - 方案B：移除跳跃式订单
             if DATA_CONFIG['CLEAN_JUMP_ORDERS']:
                 jump = (
-                    (self.df["deposit_payment_time"].notna() & self.df["intention_payment_time"].isna()) |
-                    (self.df["lock_time"].notna() & self.df["deposit_payment_time"].isna()) |
-                    (self.df["final_payment_time"].notna() & self.df["lock_time"].isna()) |
-                    (self.df["delivery_date"].notna() & self.df["final_payment_time"].isna())
+                    (present[:, 2] & ~present[:, 1]) |
+                    (present[:, 3] & ~present[:, 2]) |
+                    (present[:, 4] & ~present[:, 3]) |
+                    (present[:, 5] & ~present[:, 4])
                 )
                 self.df = self.df[~jump]
+                present = present[~jump]
                 log_analysis_progress(f"清洗后数据形状: {self.df.shape}")
+
+            # 掩码缓存一份，漏斗和退订统计直接按列求和，不再各自重扫 notna
+            self._present = present
             
-            # 添加渠道分类
+            # 添加渠道分类（map 是 C 层字典查找，免去逐行 Python 调用；
+            # 类别数有限，存成 category 让下游 value_counts/groupby 走整数键）
             if DATA_CONFIG['NORMALIZE_CATEGORIES']:
-                self.df["channel_category"] = self.df["big_channel_name"].apply(
-                    lambda x: safe_category_mapping(x, ANALYSIS_CONFIG['CHANNEL_MAPPING'])
+                self.df["channel_category"] = (
+                    self.df["big_channel_name"]
+                    .map(ANALYSIS_CONFIG['CHANNEL_MAPPING'])
+                    .fillna(ANALYSIS_CONFIG['UNKNOWN_CATEGORY'])
+                    .astype("category")
                 )
-            
+
+            self._cache_top_categories()
+
+            if cache_file:
+                try:
+                    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                    self.df.to_parquet(cache_file)
+                except Exception as e:
+                    log_analysis_progress(f"Parquet缓存写入失败: {e}", 'warning')
+
             return self.df
-            
+
         except Exception as e:
             log_analysis_progress(f"数据加载失败: {e}", 'error')
             raise
@@ -106,15 +196,16 @@ class OptimizedVehicleAttributionAnalysis:
         channel_counts = self.df["channel_category"].value_counts()
         print(channel_counts)
         
-        # 转化漏斗
+        # 转化漏斗（六列计数由缓存的掩码一次列求和得出）
         print("\n转化漏斗:")
+        stage_counts = self._present.sum(axis=0)
         funnel_data = {
-            "心愿单": self.df["wish_create_time"].notna().sum(),
-            "意向金": self.df["intention_payment_time"].notna().sum(),
-            "定金": self.df["deposit_payment_time"].notna().sum(),
-            "锁单": self.df["lock_time"].notna().sum(),
-            "尾款": self.df["final_payment_time"].notna().sum(),
-            "交付": self.df["delivery_date"].notna().sum()
+            "心愿单": int(stage_counts[0]),
+            "意向金": int(stage_counts[1]),
+            "定金": int(stage_counts[2]),
+            "锁单": int(stage_counts[3]),
+            "尾款": int(stage_counts[4]),
+            "交付": int(stage_counts[5])
         }
         
         for stage, count in funnel_data.items():
@@ -124,156 +215,136 @@ class OptimizedVehicleAttributionAnalysis:
         self.analysis_results["funnel_data"] = funnel_data
         return funnel_data
     
-    def markov_attribution_analysis(self):
-        """马尔可夫链归因分析"""
-        log_analysis_progress("\n🎯 马尔可夫链归因分析")
-        print("=" * 50)
-        
+    def _build_paths_cached(self, category_col):
+        """SoA 路径构建按 (数据框, 列) 记忆化：同一份数据上串行/并行或
+        重复调用分析方法时不再重跑 O(N×阶段数) 的构径"""
+        key = (id(self.df), category_col)
+        paths_soa = self._paths_cache.get(key)
+        if paths_soa is None:
+            paths_soa = build_paths_soa(self.df, category_col, present=self._present)
+            self._paths_cache[key] = paths_soa
+        return paths_soa
+
+    def _prepare_paths_and_nodes(self):
+        """构建三个维度（渠道/省份/车系）的路径和候选节点，只做一次
+
+        串行和并行分析共用同一份结果，避免大数据集走并行时
+        类别映射和路径构建整套重做一遍。路径采用 SoA 存储
+        （扁平 int32 编号 + 偏移数组），不再生成逐行字符串列表。
+        """
+        separator = ANALYSIS_CONFIG['PATH_SEPARATOR']
+        stages = [stage for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]]
+        paths_list = []
+        nodes_list = []
+
+        def node_ids(paths_soa, categories):
+            """候选节点直接取 SoA 内的整数编号，马尔可夫计算不再碰字符串；
+            数据里没出现的 阶段×类别 组合在这里就被滤掉"""
+            idx = paths_soa[3]
+            ids = []
+            for cat in categories:
+                for stage in stages:
+                    nid = idx.get(f"{stage}{separator}{cat}")
+                    if nid is not None:
+                        ids.append(nid)
+            return ids
+
         # 渠道分析
         log_analysis_progress("渠道归因分析...")
-        paths_channel = build_optimized_paths(self.df, "channel_category")
-        channel_nodes = [
-            f"{stage}{ANALYSIS_CONFIG['PATH_SEPARATOR']}{ch}" 
-            for ch in ["HQ", "STORE"] 
-            for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]
-        ]
-        
-        channel_effects = removal_effect_optimized(
-            paths_channel, 
-            channel_nodes, 
-            use_sparse=DATA_CONFIG['USE_SPARSE_MATRIX']
-        )
-        
-        print("渠道归因分析:")
-        for node, effect in sorted(channel_effects, key=lambda x: -x[1]):
-            print(f"  {node:<25}: {effect:+.2f} pp")
-        
+        channel_paths = self._build_paths_cached("channel_category")
+        paths_list.append(channel_paths)
+        nodes_list.append(node_ids(channel_paths, ["HQ", "STORE"]))
+
         # 省份分析
         log_analysis_progress("省份归因分析...")
-        top_provinces = self.df["province_name"].value_counts().head(ANALYSIS_CONFIG['TOP_PROVINCES']).index.tolist()
-        self.df["province_cat"] = self.df["province_name"].apply(
-            lambda x: safe_category_mapping(x, {p: p for p in top_provinces})
+        top_provinces = self._top_provinces
+        self.df["province_cat"] = (
+            self.df["province_name"]
+            .map({p: p for p in top_provinces})
+            .fillna(ANALYSIS_CONFIG['UNKNOWN_CATEGORY'])
+            .astype("category")
         )
-        
-        paths_province = build_optimized_paths(self.df, "province_cat")
-        province_nodes = [
-            f"{stage}{ANALYSIS_CONFIG['PATH_SEPARATOR']}{prov}" 
-            for prov in top_provinces 
-            for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]
-        ]
-        
-        province_effects = removal_effect_optimized(
-            paths_province, 
-            province_nodes, 
-            use_sparse=DATA_CONFIG['USE_SPARSE_MATRIX']
-        )
-        
-        print(f"\n省份归因分析 (Top {ANALYSIS_CONFIG['TOP_PROVINCES']}):")
-        for node, effect in sorted(province_effects, key=lambda x: -x[1])[:10]:
-            print(f"  {node:<25}: {effect:+.2f} pp")
-        
+        province_paths = self._build_paths_cached("province_cat")
+        paths_list.append(province_paths)
+        nodes_list.append(node_ids(province_paths, top_provinces))
+
         # 车系分析
         log_analysis_progress("车系归因分析...")
-        top_series = self.df["series"].value_counts().head(ANALYSIS_CONFIG['TOP_SERIES']).index.tolist()
-        self.df["series_cat"] = self.df["series"].apply(
-            lambda x: safe_category_mapping(x, {s: s for s in top_series})
-        )
-        
-        paths_series = build_optimized_paths(self.df, "series_cat")
-        series_nodes = [
-            f"{stage}{ANALYSIS_CONFIG['PATH_SEPARATOR']}{series}" 
-            for series in top_series 
-            for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]
-        ]
-        
-        series_effects = removal_effect_optimized(
-            paths_series, 
-            series_nodes, 
-            use_sparse=DATA_CONFIG['USE_SPARSE_MATRIX']
+        top_series = self._top_series
+        self.df["series_cat"] = (
+            self.df["series"]
+            .map({s: s for s in top_series})
+            .fillna(ANALYSIS_CONFIG['UNKNOWN_CATEGORY'])
+            .astype("category")
         )
-        
+        series_paths = self._build_paths_cached("series_cat")
+        paths_list.append(series_paths)
+        nodes_list.append(node_ids(series_paths, top_series))
+
+        return paths_list, nodes_list
+
+    def _print_and_store_effects(self, channel_effects, province_effects, series_effects):
+        """打印三个维度的归因结果并写入 analysis_results
+
+        排序结果同时缓存，总结报告直接取 [0]，不再对整个列表重扫 max；
+        排序键用 itemgetter 走 C 层取值，免去逐元素 lambda 调用和取负
+        """
+        channel_sorted = sorted(channel_effects, key=itemgetter(1), reverse=True)
+        province_sorted = sorted(province_effects, key=itemgetter(1), reverse=True)
+        series_sorted = sorted(series_effects, key=itemgetter(1), reverse=True)
+
+        print("渠道归因分析:")
+        for node, effect in channel_sorted:
+            print(f"  {node:<25}: {effect:+.2f} pp")
+
+        print(f"\n省份归因分析 (Top {ANALYSIS_CONFIG['TOP_PROVINCES']}):")
+        for node, effect in province_sorted[:10]:
+            print(f"  {node:<25}: {effect:+.2f} pp")
+
         print(f"\n车系归因分析 (Top {ANALYSIS_CONFIG['TOP_SERIES']}):")
-        for node, effect in sorted(series_effects, key=lambda x: -x[1])[:10]:
+        for node, effect in series_sorted[:10]:
             print(f"  {node:<25}: {effect:+.2f} pp")
-        
+
         self.analysis_results["channel_effects"] = channel_effects
         self.analysis_results["province_effects"] = province_effects
         self.analysis_results["series_effects"] = series_effects
-        
+        self.analysis_results["channel_effects_sorted"] = channel_sorted
+        self.analysis_results["province_effects_sorted"] = province_sorted
+        self.analysis_results["series_effects_sorted"] = series_sorted
+
+    def markov_attribution_analysis(self, prepared=None):
+        """马尔可夫链归因分析（串行）"""
+        log_analysis_progress("\n🎯 马尔可夫链归因分析")
+        print("=" * 50)
+
+        paths_list, nodes_list = prepared if prepared is not None else self._prepare_paths_and_nodes()
+        if all(isinstance(paths, tuple) for paths in paths_list):
+            # 三个维度共用一次块对角稀疏分解，基准转化率一把解完
+            channel_effects, province_effects, series_effects = fused_removal_effect(
+                paths_list, nodes_list
+            )
+        else:
+            channel_effects, province_effects, series_effects = [
+                removal_effect_optimized(paths, nodes, use_sparse=DATA_CONFIG['USE_SPARSE_MATRIX'])
+                for paths, nodes in zip(paths_list, nodes_list)
+            ]
+
+        self._print_and_store_effects(channel_effects, province_effects, series_effects)
         return channel_effects, province_effects, series_effects
-    
-    def parallel_analysis(self):
+
+    def parallel_analysis(self, prepared=None):
         """并行分析（大数据集优化）"""
         log_analysis_progress("\n⚡ 并行归因分析")
         print("=" * 50)
-        
-        # 准备并行分析数据
-        paths_list = []
-        nodes_list = []
-        
-        # 渠道分析
-        paths_channel = build_optimized_paths(self.df, "channel_category")
-        channel_nodes = [
-            f"{stage}{ANALYSIS_CONFIG['PATH_SEPARATOR']}{ch}" 
-            for ch in ["HQ", "STORE"] 
-            for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]
-        ]
-        paths_list.append(paths_channel)
-        nodes_list.append(channel_nodes)
-        
-        # 省份分析
-        top_provinces = self.df["province_name"].value_counts().head(ANALYSIS_CONFIG['TOP_PROVINCES']).index.tolist()
-        self.df["province_cat"] = self.df["province_name"].apply(
-            lambda x: safe_category_mapping(x, {p: p for p in top_provinces})
-        )
-        paths_province = build_optimized_paths(self.df, "province_cat")
-        province_nodes = [
-            f"{stage}{ANALYSIS_CONFIG['PATH_SEPARATOR']}{prov}" 
-            for prov in top_provinces 
-            for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]
-        ]
-        paths_list.append(paths_province)
-        nodes_list.append(province_nodes)
-        
-        # 车系分析
-        top_series = self.df["series"].value_counts().head(ANALYSIS_CONFIG['TOP_SERIES']).index.tolist()
-        self.df["series_cat"] = self.df["series"].apply(
-            lambda x: safe_category_mapping(x, {s: s for s in top_series})
-        )
-        paths_series = build_optimized_paths(self.df, "series_cat")
-        series_nodes = [
-            f"{stage}{ANALYSIS_CONFIG['PATH_SEPARATOR']}{series}" 
-            for series in top_series 
-            for _, stage in ANALYSIS_CONFIG['STAGE_COLS'][1:]
-        ]
-        paths_list.append(paths_series)
-        nodes_list.append(series_nodes)
-        
-        # 执行并行分析
+
+        paths_list, nodes_list = prepared if prepared is not None else self._prepare_paths_and_nodes()
         results = parallel_removal_effect(paths_list, nodes_list)
-        
+
         if len(results) >= 3:
             channel_effects, province_effects, series_effects = results[:3]
-            
-            print("并行分析结果:")
-            print("渠道归因:")
-            for node, effect in sorted(channel_effects, key=lambda x: -x[1]):
-                print(f"  {node:<25}: {effect:+.2f} pp")
-            
-            print(f"\n省份归因 (Top {ANALYSIS_CONFIG['TOP_PROVINCES']}):")
-            for node, effect in sorted(province_effects, key=lambda x: -x[1])[:10]:
-                print(f"  {node:<25}: {effect:+.2f} pp")
-            
-            print(f"\n车系归因 (Top {ANALYSIS_CONFIG['TOP_SERIES']}):")
-            for node, effect in sorted(series_effects, key=lambda x: -x[1])[:10]:
-                print(f"  {node:<25}: {effect:+.2f} pp")
-            
-            self.analysis_results["parallel_channel_effects"] = channel_effects
-            self.analysis_results["parallel_province_effects"] = province_effects
-            self.analysis_results["parallel_series_effects"] = series_effects
-            
+            self._print_and_store_effects(channel_effects, province_effects, series_effects)
             return channel_effects, province_effects, series_effects
-        
+
         return [], [], []
     
     def time_series_analysis(self):
@@ -281,19 +352,39 @@ class OptimizedVehicleAttributionAnalysis:
         log_analysis_progress("\n⏰ 时间序列分析")
         print("=" * 50)
         
-        # 按月统计订单量
-        self.df["order_month"] = pd.to_datetime(self.df["order_create_time"]).dt.to_period('M')
-        monthly_orders = self.df.groupby("order_month").size()
-        
+        # 按月统计：交付与否先落成布尔列（复用缓存掩码的交付列），
+        # 订单量和转化率在同一次 groupby 聚合里算出，免去逐组 Python 回调
+        self.df["order_month"] = self.df["order_create_time"].dt.to_period('M')
+        self.df["_delivered"] = self._present[:, 5]
+        if POLARS_AVAILABLE:
+            # 聚合在 polars 的多线程引擎里做，只把几十行的月度结果转回 pandas
+            monthly = (
+                pl.from_pandas(self.df[["order_create_time"]])
+                .with_columns(
+                    pl.col("order_create_time").dt.truncate("1mo").alias("order_month"),
+                    pl.Series("_delivered", self._present[:, 5]),
+                )
+                .group_by("order_month")
+                .agg(orders=pl.len(), conv=pl.col("_delivered").mean())
+                .sort("order_month")
+                .to_pandas()
+                .set_index("order_month")
+            )
+            monthly.index = monthly.index.to_period('M')
+        else:
+            # sort=False 让 groupby 免去对百万行分组键的排序，月份只有几十个，
+            # 聚合出的小结果排一次序即可
+            monthly = self.df.groupby("order_month", observed=True, sort=False).agg(
+                orders=("_delivered", "size"),
+                conv=("_delivered", "mean")
+            ).sort_index()
+        monthly_orders = monthly["orders"]
+        monthly_conversion = monthly["conv"] * 100
+
         print("月度订单量趋势:")
         for month, count in monthly_orders.tail(6).items():
             print(f"  {month}: {count:,} 订单")
-        
-        # 月度转化率
-        monthly_conversion = self.df.groupby("order_month").apply(
-            lambda x: x["delivery_date"].notna().sum() / len(x) * 100
-        )
-        
+
         print("\n月度转化率趋势:")
         for month, rate in monthly_conversion.tail(6).items():
             print(f"  {month}: {rate:.2f}%")
@@ -308,24 +399,21 @@ class OptimizedVehicleAttributionAnalysis:
         log_analysis_progress("\n❌ 退订分析")
         print("=" * 50)
         
+        # 退订计数直接在缓存的掩码上做位运算，不再构造整列布尔索引
+        present = self._present
+
         # 意向金退订率
-        intention_cancelled = self.df[
-            (self.df["intention_payment_time"].notna()) & 
-            (self.df["deposit_payment_time"].isna())
-        ].shape[0]
-        intention_total = self.df["intention_payment_time"].notna().sum()
+        intention_cancelled = int((present[:, 1] & ~present[:, 2]).sum())
+        intention_total = int(present[:, 1].sum())
         intention_cancel_rate = intention_cancelled / intention_total * 100 if intention_total > 0 else 0
-        
+
         print(f"意向金退订率: {intention_cancel_rate:.2f}% ({intention_cancelled:,}/{intention_total:,})")
-        
+
         # 定金退订率
-        deposit_cancelled = self.df[
-            (self.df["deposit_payment_time"].notna()) & 
-            (self.df["lock_time"].isna())
-        ].shape[0]
-        deposit_total = self.df["deposit_payment_time"].notna().sum()
+        deposit_cancelled = int((present[:, 2] & ~present[:, 3]).sum())
+        deposit_total = int(present[:, 2].sum())
         deposit_cancel_rate = deposit_cancelled / deposit_total * 100 if deposit_total > 0 else 0
-        
+
         print(f"定金退订率: {deposit_cancel_rate:.2f}% ({deposit_cancelled:,}/{deposit_total:,})")
         
         # Hold原因分析
@@ -348,16 +436,17 @@ class OptimizedVehicleAttributionAnalysis:
         # 关键发现
         print("🔍 关键发现:")
         
-        if "channel_effects" in self.analysis_results:
-            top_channel = max(self.analysis_results["channel_effects"], key=lambda x: x[1])
+        # 各维度结果在打印时已排好序，取 [0] 即最大贡献，不再整列表扫 max
+        if self.analysis_results.get("channel_effects_sorted"):
+            top_channel = self.analysis_results["channel_effects_sorted"][0]
             print(f"  渠道贡献最大: {top_channel[0]}, 移除效应为 {top_channel[1]:+.2f} pp")
-        
-        if "province_effects" in self.analysis_results:
-            top_province = max(self.analysis_results["province_effects"], key=lambda x: x[1])
+
+        if self.analysis_results.get("province_effects_sorted"):
+            top_province = self.analysis_results["province_effects_sorted"][0]
             print(f"  省份贡献最大: {top_province[0]}, 移除效应为 {top_province[1]:+.2f} pp")
-        
-        if "series_effects" in self.analysis_results:
-            top_series = max(self.analysis_results["series_effects"], key=lambda x: x[1])
+
+        if self.analysis_results.get("series_effects_sorted"):
+            top_series = self.analysis_results["series_effects_sorted"][0]
             print(f"  车系贡献最大: {top_series[0]}, 移除效应为 {top_series[1]:+.2f} pp")
         
         # 数据质量总结
@@ -374,6 +463,21 @@ class OptimizedVehicleAttributionAnalysis:
             print(f"  心愿单到交付转化率: {funnel['交付']/funnel['心愿单']*100:.1f}%")
             print(f"  意向金到交付转化率: {funnel['交付']/funnel['意向金']*100:.1f}%")
     
+    @staticmethod
+    def _write_csv(df, path):
+        """写 CSV：pyarrow 的 C++ 写出器比 pandas 快一个量级，装了且编码是
+        纯 UTF-8 时优先用；配置要求带 BOM（utf-8-sig）或缺 pyarrow 时退回 pandas"""
+        encoding = OUTPUT_CONFIG['CSV_ENCODING']
+        if encoding.lower().replace("-", "_") == "utf_8":
+            try:
+                import pyarrow as pa
+                import pyarrow.csv as pacsv
+                pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+                return
+            except ImportError:
+                pass
+        df.to_csv(path, index=False, encoding=encoding)
+
     def save_results(self):
         """保存分析结果"""
         log_analysis_progress("\n💾 保存分析结果")
@@ -388,7 +492,7 @@ class OptimizedVehicleAttributionAnalysis:
                 self.analysis_results["channel_effects"], 
                 columns=["node", "removal_effect"]
             )
-            channel_df.to_csv("data/channel_removal_effects.csv", index=False, encoding=OUTPUT_CONFIG['CSV_ENCODING'])
+            self._write_csv(channel_df, "data/channel_removal_effects.csv")
             log_analysis_progress("渠道归因结果已保存到 data/channel_removal_effects.csv")
         
         # 保存省份归因结果
@@ -397,7 +501,7 @@ class OptimizedVehicleAttributionAnalysis:
                 self.analysis_results["province_effects"], 
                 columns=["node", "removal_effect"]
             )
-            province_df.to_csv("data/province_removal_effects.csv", index=False, encoding=OUTPUT_CONFIG['CSV_ENCODING'])
+            self._write_csv(province_df, "data/province_removal_effects.csv")
             log_analysis_progress("省份归因结果已保存到 data/province_removal_effects.csv")
         
         # 保存车系归因结果
@@ -406,7 +510,7 @@ class OptimizedVehicleAttributionAnalysis:
                 self.analysis_results["series_effects"], 
                 columns=["node", "removal_effect"]
             )
-            series_df.to_csv("data/series_removal_effects.csv", index=False, encoding=OUTPUT_CONFIG['CSV_ENCODING'])
+            self._write_csv(series_df, "data/series_removal_effects.csv")
             log_analysis_progress("车系归因结果已保存到 data/series_removal_effects.csv")
         
         # 保存数据质量报告
@@ -414,7 +518,7 @@ class OptimizedVehicleAttributionAnalysis:
             {"metric": k, "value": str(v)} 
             for k, v in self.validation_results.items()
         ])
-        validation_df.to_csv("data/data_quality_report.csv", index=False, encoding=OUTPUT_CONFIG['CSV_ENCODING'])
+        self._write_csv(validation_df, "data/data_quality_report.csv")
         log_analysis_progress("数据质量报告已保存到 data/data_quality_report.csv")
     
     def run_full_analysis(self):
@@ -429,17 +533,24 @@ class OptimizedVehicleAttributionAnalysis:
             # 2. 基础数据探索
             self.basic_data_exploration()
             
-            # 3. 马尔可夫链归因分析
-            self.markov_attribution_analysis()
-            
-            # 4. 并行分析（可选）
-            if len(self.df) > 10000:  # 大数据集使用并行分析
+            # 3. 马尔可夫链归因分析：路径和节点只构建一次，
+            # 大数据集切到并行求解，小数据集串行（不再两套都跑）
+            prepared = self._prepare_paths_and_nodes()
+            if len(self.df) > 10000:
                 log_analysis_progress("检测到大数据集，启用并行分析...")
-                self.parallel_analysis()
-            
+                self.parallel_analysis(prepared)
+            else:
+                self.markov_attribution_analysis(prepared)
+
+            # 归因结果已落入 analysis_results，辅助列和路径缓存即刻释放，
+            # 压低峰值内存、后续整表扫描也更省
+            self.df.drop(columns=["province_cat", "series_cat"], inplace=True, errors="ignore")
+            self._paths_cache.clear()
+
             # 5. 时间序列分析
             self.time_series_analysis()
-            
+            self.df.drop(columns=["order_month", "_delivered"], inplace=True, errors="ignore")
+
             # 6. 退订分析
             self.cancellation_analysis()
             
@@ -8,8 +8,10 @@ import unittest
 import pandas as pd
 import numpy as np
 from utils import (
-    build_optimized_paths, 
-    removal_effect_optimized, 
+    build_optimized_paths,
+    build_paths_soa,
+    removal_effect_optimized,
+    fused_removal_effect,
     safe_category_mapping,
     validate_data_quality,
     safe_matrix_inverse
@@ -167,6 +169,42 @@ class TestMarkovAttribution(unittest.TestCase):
         # 验证结果一致性
         self.assertEqual(len(effects_dense), len(effects_sparse))
     
+    def test_fused_removal_effect(self):
+        """测试融合求解与逐维度求解的一致性"""
+        paths_list = [
+            build_paths_soa(self.test_data, 'channel_category'),
+            build_paths_soa(self.test_data, 'province_name')
+        ]
+        nodes_list = [
+            [s for s in soa[3] if s not in ("Start", "Conversion", "Null")]
+            for soa in paths_list
+        ]
+
+        fused = fused_removal_effect(paths_list, nodes_list)
+
+        # 各维度结果应与逐维度求解完全一致
+        self.assertEqual(len(fused), len(paths_list))
+        for soa, nodes, effects in zip(paths_list, nodes_list, fused):
+            self.assertEqual(dict(effects),
+                             dict(removal_effect_optimized(soa, nodes)))
+
+        # 全量转化（无 Null 状态）的退化输入也应保持一致
+        converted_data = pd.DataFrame({
+            'wish_create_time': pd.date_range('2023-01-01', periods=100, freq='D'),
+            'intention_payment_time': pd.date_range('2023-01-01', periods=100, freq='D'),
+            'deposit_payment_time': pd.date_range('2023-01-01', periods=100, freq='D'),
+            'lock_time': pd.date_range('2023-01-01', periods=100, freq='D'),
+            'final_payment_time': pd.date_range('2023-01-01', periods=100, freq='D'),
+            'delivery_date': pd.date_range('2023-01-01', periods=100, freq='D'),
+            'channel_category': ['STORE'] * 50 + ['HQ'] * 50
+        })
+        soa = build_paths_soa(converted_data, 'channel_category')
+        nodes = [s for s in soa[3] if s not in ("Start", "Conversion", "Null")]
+
+        fused_degenerate = fused_removal_effect([soa], [nodes])
+        self.assertEqual(dict(fused_degenerate[0]),
+                         dict(removal_effect_optimized(soa, nodes)))
+
     def test_config_integration(self):
         """测试配置集成"""
         # 验证配置参数
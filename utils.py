@@ -7,15 +7,141 @@
 import pandas as pd
 import numpy as np
 import logging
+import threading
 from scipy.sparse import csr_matrix
 from scipy.sparse.linalg import inv
 import warnings
 from config import ANALYSIS_CONFIG, DATA_CONFIG, ERROR_CONFIG
 
+# numba 可选依赖：装了就把稀疏内核编译成机器码，没装退回 NumPy 实现
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # 设置日志
 logging.basicConfig(level=getattr(logging, ERROR_CONFIG['LOG_LEVEL']))
 logger = logging.getLogger(__name__)
 
+
+def _zero_node_csr(data, indices, indptr, node_idx):
+    """在 CSR 的 data/indices/indptr 三元组上就地清零 node_idx 的整行与整列"""
+    data[indptr[node_idx]:indptr[node_idx + 1]] = 0.0
+    data[indices == node_idx] = 0.0
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _zero_node_csr(data, indices, indptr, node_idx):  # noqa: F811
+        for j in range(indptr[node_idx], indptr[node_idx + 1]):
+            data[j] = 0.0
+        for j in range(len(indices)):
+            if indices[j] == node_idx:
+                data[j] = 0.0
+
+
+def _woodbury_new_conv(Q, R, N, w, k):
+    """移除转移节点 k 后的转化概率：对缓存的 N/w 做秩 m Woodbury 修正
+
+    只有 k 行本身（清零）和指向 k 的行（重新归一化）发生变化，
+    扰动矩阵 dQ/dR 按受影响行构造；奇异时抛 LinAlgError 由调用方回退
+    """
+    rows = np.flatnonzero(Q[:, k])
+    if k not in rows:
+        rows = np.append(rows, k)
+    dQ = np.zeros((len(rows), Q.shape[1]))
+    dR = np.zeros((len(rows), R.shape[1]))
+    for m_i, i in enumerate(rows):
+        qi = Q[i]
+        if i == k:
+            dQ[m_i] = -qi
+            dR[m_i] = -R[k]
+            continue
+        s = 1.0 - qi[k]
+        if s > 0:
+            new_q = qi.copy()
+            new_q[k] = 0.0
+            dQ[m_i] = new_q / s - qi
+            dR[m_i] = R[i] / s - R[i]
+        else:
+            dQ[m_i] = -qi
+            dR[m_i] = -R[i]
+
+    M = np.eye(len(rows)) - dQ @ N[:, rows]
+    corr = np.linalg.solve(M, dQ @ N)
+    w2 = w + w[rows] @ corr
+    return (w2 @ R + w2[rows] @ dR)[0]
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _woodbury_new_conv(Q, R, N, w, k):  # noqa: F811
+        n = Q.shape[0]
+        r = R.shape[1]
+        m = 0
+        has_k = False
+        for i in range(n):
+            if Q[i, k] != 0.0:
+                m += 1
+                if i == k:
+                    has_k = True
+        if not has_k:
+            m += 1
+        rows = np.empty(m, dtype=np.int64)
+        p = 0
+        for i in range(n):
+            if Q[i, k] != 0.0:
+                rows[p] = i
+                p += 1
+        if not has_k:
+            rows[p] = k
+
+        dQ = np.zeros((m, n))
+        dR = np.zeros((m, r))
+        for m_i in range(m):
+            i = rows[m_i]
+            if i == k:
+                for j in range(n):
+                    dQ[m_i, j] = -Q[i, j]
+                for j in range(r):
+                    dR[m_i, j] = -R[k, j]
+                continue
+            s = 1.0 - Q[i, k]
+            if s > 0:
+                for j in range(n):
+                    q = 0.0 if j == k else Q[i, j]
+                    dQ[m_i, j] = q / s - Q[i, j]
+                for j in range(r):
+                    dR[m_i, j] = R[i, j] / s - R[i, j]
+            else:
+                for j in range(n):
+                    dQ[m_i, j] = -Q[i, j]
+                for j in range(r):
+                    dR[m_i, j] = -R[i, j]
+
+        Nk = np.empty((n, m))
+        for j in range(m):
+            Nk[:, j] = N[:, rows[j]]
+        M = np.eye(m) - dQ @ Nk
+        corr = np.linalg.solve(M, dQ @ N)
+        wr = np.empty(m)
+        for j in range(m):
+            wr[j] = w[rows[j]]
+        w2 = w + wr @ corr
+        wr2 = np.empty(m)
+        for j in range(m):
+            wr2[j] = w2[rows[j]]
+        return (w2 @ R + wr2 @ dR)[0]
+
+def _df_to_c(df, cols):
+    """取列子集为 C 连续的 ndarray
+
+    pandas 的块存储按列连续（F 序），逐行扫描会以整列为步长跳着访存；
+    这里一次性转成行主序，供后面的行循环顺序读取
+    """
+    return np.ascontiguousarray(df[cols].to_numpy())
+
 def safe_category_mapping(value, mapping_dict, unknown_value="UNKNOWN"):
     """
     安全的类别映射，处理空值和异常值
@@ -42,59 +168,208 @@ def safe_category_mapping(value, mapping_dict, unknown_value="UNKNOWN"):
 def build_optimized_paths(df, category_col, stage_cols=None):
     """
     优化的路径构建函数
-    
+
+    向量化实现：类别规范化（空值/空串归 UNKNOWN）只在去重后的类别表上做，
+    "阶段||类别" 标签按 类别×阶段 预拼一张表，逐行只剩查表和列表拼装，
+    不再经过 df.apply 的逐行 Python 调度；缺失的阶段列按全空处理。
+
     Args:
         df: 数据框
         category_col: 分类列名
         stage_cols: 阶段列配置
-    
+
     Returns:
         路径列表
     """
     if stage_cols is None:
         stage_cols = ANALYSIS_CONFIG['STAGE_COLS']
-    
+
     separator = ANALYSIS_CONFIG['PATH_SEPARATOR']
     unknown_cat = ANALYSIS_CONFIG['UNKNOWN_CATEGORY']
-    
-    def row_path(row):
-        """构建单行路径"""
-        path = ["Start"]
-        
-        # 安全处理分类值
-        cat = row[category_col]
-        if pd.isna(cat):
-            cat = unknown_cat
-        else:
-            cat = str(cat).strip()
-            if not cat:
-                cat = unknown_cat
-        
-        # 构建路径，使用分隔符防止特殊字符问题
-        for col, stage in stage_cols:
-            if pd.notna(row[col]):
-                path.append(f"{stage}{separator}{cat}")
-        
-        # 确定最终状态
-        if pd.notna(row["delivery_date"]):
-            path.append("Conversion")
-        else:
-            path.append("Null")
-        
-        return path
-    
+
     if df.empty:
         return []
-    paths = df.apply(row_path, axis=1).tolist()
-    
-    # 过滤无效路径
+
+    col = df[category_col]
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("category")
+    cat_names = np.char.strip(col.cat.categories.to_numpy().astype(str))
+    cat_names[cat_names == ""] = unknown_cat
+    codes = col.cat.codes.to_numpy()
+    if (codes < 0).any():
+        cat_names = np.append(cat_names, unknown_cat)
+        codes = np.where(codes < 0, len(cat_names) - 1, codes)
+
+    stage_col_names = [c for c, _ in stage_cols]
+    if all(c in df.columns for c in stage_col_names):
+        present = _df_to_c(df[stage_col_names].notna(), stage_col_names)
+    else:
+        present = np.stack([
+            df[c].notna().to_numpy() if c in df.columns else np.zeros(len(df), dtype=bool)
+            for c, _ in stage_cols
+        ], axis=1)
+    delivered = (df["delivery_date"].notna().to_numpy()
+                 if "delivery_date" in df.columns else np.zeros(len(df), dtype=bool))
+
+    # 构建路径，使用分隔符防止特殊字符问题
+    stage_names = np.array([stage for _, stage in stage_cols])
+    label_table = np.char.add(np.char.add(stage_names[None, :], separator),
+                              cat_names[:, None])
+
     min_length = ANALYSIS_CONFIG['MIN_PATH_LENGTH']
     max_length = ANALYSIS_CONFIG['MAX_PATH_LENGTH']
-    valid_paths = [p for p in paths if min_length <= len(p) <= max_length]
-    
-    logger.info(f"构建路径完成: {len(valid_paths)}/{len(paths)} 有效路径")
+    n_stages = len(stage_cols)
+
+    valid_paths = []
+    for i in range(len(df)):
+        labels = label_table[codes[i]]
+        path = ["Start"]
+        for j in range(n_stages):
+            if present[i, j]:
+                path.append(labels[j])
+        path.append("Conversion" if delivered[i] else "Null")
+        # 过滤无效路径
+        if min_length <= len(path) <= max_length:
+            valid_paths.append(path)
+
+    logger.info(f"构建路径完成: {len(valid_paths)}/{len(df)} 有效路径")
     return valid_paths
 
+def build_paths_soa(df, category_col, stage_cols=None, present=None):
+    """构建 SoA 形式的路径：扁平 int32 节点编号数组 + 偏移数组
+
+    与 build_optimized_paths 语义一致（类别空值归 UNKNOWN、路径长度过滤），
+    但不生成逐行 Python 字符串列表：标签按 类别×阶段 预拼一张表，行内只查表
+    取编号，内存按路径 token 数线性、转移计数可直接在编号数组上进行。
+
+    Args:
+        df: 数据框
+        category_col: 分类列名
+        stage_cols: 阶段列配置
+        present: 可选的 (N, 阶段数) 布尔掩码；调用方已算过 notna 时传入复用，
+            免去每个维度各自重扫六个时间列
+
+    Returns:
+        (node_ids, offsets, states, idx) 四元组
+    """
+    if stage_cols is None:
+        stage_cols = ANALYSIS_CONFIG['STAGE_COLS']
+
+    separator = ANALYSIS_CONFIG['PATH_SEPARATOR']
+    unknown_cat = ANALYSIS_CONFIG['UNKNOWN_CATEGORY']
+
+    if df.empty:
+        return (np.zeros(0, dtype=np.int32), np.zeros(1, dtype=np.int32), [], {})
+
+    # 类别规范化只在去重后的类别表上做：空串归 UNKNOWN，缺失码补 UNKNOWN
+    col = df[category_col]
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("category")
+    cat_names = np.char.strip(col.cat.categories.to_numpy().astype(str))
+    cat_names[cat_names == ""] = unknown_cat
+    codes = col.cat.codes.to_numpy()
+    if (codes < 0).any():
+        cat_names = np.append(cat_names, unknown_cat)
+        codes = np.where(codes < 0, len(cat_names) - 1, codes)
+
+    if present is None:
+        stage_col_names = [c for c, _ in stage_cols]
+        if all(c in df.columns for c in stage_col_names):
+            present = _df_to_c(df[stage_col_names].notna(), stage_col_names)
+        else:
+            present = np.stack([
+                df[c].notna().to_numpy() if c in df.columns else np.zeros(len(df), dtype=bool)
+                for c, _ in stage_cols
+            ], axis=1)
+    delivery_pos = [j for j, (c, _) in enumerate(stage_cols) if c == "delivery_date"]
+    if delivery_pos:
+        delivered = present[:, delivery_pos[0]]
+    else:
+        delivered = (df["delivery_date"].notna().to_numpy()
+                     if "delivery_date" in df.columns else np.zeros(len(df), dtype=bool))
+
+    stage_names = np.array([stage for _, stage in stage_cols])
+    label_table = np.char.add(np.char.add(stage_names[None, :], separator),
+                              cat_names[:, None])
+
+    # 路径长度 = Start + 有值阶段数 + 终态，按配置过滤
+    lengths = 2 + present.sum(axis=1)
+    keep = (
+        (lengths >= ANALYSIS_CONFIG['MIN_PATH_LENGTH']) &
+        (lengths <= ANALYSIS_CONFIG['MAX_PATH_LENGTH'])
+    )
+    n_keep = int(keep.sum())
+    n_stages = len(stage_cols)
+    kept_present = present[keep]
+    kept_codes = codes[keep]
+
+    # 编号分配整体向量化：类别×阶段 组合编成 pair 码，按行主序的
+    # 首次出现顺序赋 id（与逐行 intern 的结果一致），固定态占 0/1/2
+    start_id, conv_id, null_id = 0, 1, 2
+    states = ["Start", "Conversion", "Null"]
+    pair = kept_codes[:, None] * n_stages + np.arange(n_stages)[None, :]
+    seen = pair[kept_present]
+    uniq, first_pos = np.unique(seen, return_index=True)
+    order = np.argsort(first_pos)
+    id_table = np.full(label_table.size, -1, dtype=np.int32)
+    id_table[uniq[order]] = 3 + np.arange(len(uniq), dtype=np.int32)
+    states.extend(map(str, label_table.ravel()[uniq[order]]))
+    idx = {s: i for i, s in enumerate(states)}
+
+    # 路径矩阵 (n_keep, 阶段数+2)：缺失阶段填 -1 哨兵，展平后滤掉即为
+    # SoA 扁平编号数组，整条构建不再有逐行 Python 循环
+    path_codes = np.full((n_keep, n_stages + 2), -1, dtype=np.int32)
+    path_codes[:, 0] = start_id
+    path_codes[:, 1:-1] = np.where(kept_present, id_table[pair], -1)
+    path_codes[:, -1] = np.where(delivered[keep], conv_id, null_id)
+
+    node_ids = path_codes.ravel()
+    node_ids = node_ids[node_ids >= 0]
+    offsets = np.zeros(n_keep + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum(lengths[keep])
+
+    logger.info(f"构建路径完成: {n_keep}/{len(df)} 有效路径")
+    return (node_ids, offsets, states, idx)
+
+def transition_matrix_from_soa(paths_soa, use_sparse=False):
+    """从 SoA 路径构建转移矩阵：相邻编号即为边，屏蔽跨路径的边后一次 bincount 计数
+
+    Args:
+        paths_soa: build_paths_soa 的返回值
+        use_sparse: 是否使用稀疏矩阵
+
+    Returns:
+        转移矩阵、状态索引和状态列表
+    """
+    node_ids, offsets, states, idx = paths_soa
+    n = len(states)
+    if n == 0:
+        return np.zeros((0, 0), dtype=np.float64), idx, states
+
+    src = node_ids[:-1].astype(np.int64)
+    dst = node_ids[1:]
+    valid = np.ones(len(src), dtype=bool)
+    valid[offsets[1:-1] - 1] = False
+    counts = np.bincount(src[valid] * n + dst[valid],
+                         minlength=n * n).reshape(n, n).astype(np.float64)
+
+    if use_sparse and DATA_CONFIG['USE_SPARSE_MATRIX']:
+        T = csr_matrix(counts)
+        row_sums = np.asarray(T.sum(axis=1)).ravel()
+        row_sums[row_sums == 0] = 1.0
+        # 行和倒数按 indptr 展开后直接乘在 data 上：O(nnz) 原地缩放，
+        # 不走 multiply 产出 COO 再重建 CSR 结构（与稠密分支同一算式）
+        T.data *= np.repeat(1.0 / row_sums, np.diff(T.indptr))
+    else:
+        # 倒数只算一遍（n×1），整块归一化走 SIMD 友好的乘法而非掩码除法
+        row_sum = counts.sum(axis=1, keepdims=True)
+        inv = np.zeros_like(row_sum)
+        np.divide(1.0, row_sum, out=inv, where=row_sum != 0)
+        counts *= inv
+        T = counts
+
+    return T, idx, states
+
 def create_transition_matrix(paths, use_sparse=False):
     """
     创建转移矩阵，支持稀疏矩阵
@@ -106,42 +381,43 @@ def create_transition_matrix(paths, use_sparse=False):
     Returns:
         转移矩阵和状态索引
     """
-    # 收集所有状态
-    states = sorted({s for p in paths for s in p})
+    # 状态字符串一次性 intern 成整数编号（np.unique 顺带排序，
+    # 与原先 sorted(set) 的编号顺序一致），计数和索引全在 int 数组上进行，
+    # 不再对每条边做两次字符串哈希
+    lengths = np.fromiter((len(p) for p in paths), dtype=np.int64, count=len(paths))
+    flat = np.array([s for p in paths for s in p])
+    states_arr, inverse = np.unique(flat, return_inverse=True)
+    states = states_arr.tolist()
     idx = {s: i for i, s in enumerate(states)}
     n = len(states)
-    
+    if n == 0:
+        return np.zeros((0, 0), dtype=np.float64), idx, states
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    # 拼接后的编号数组里相邻元素即为边，屏蔽跨路径的“伪边”后
+    # 一次 bincount 完成全部转移计数，不再有逐边的 Python 循环
+    valid = np.ones(len(inverse) - 1, dtype=bool)
+    valid[offsets[1:-1] - 1] = False
+    counts = np.bincount(inverse[:-1][valid] * n + inverse[1:][valid],
+                         minlength=n * n).reshape(n, n).astype(np.float64)
+
     if use_sparse and DATA_CONFIG['USE_SPARSE_MATRIX']:
         # 使用稀疏矩阵
-        row_indices = []
-        col_indices = []
-        data = []
-        
-        for p in paths:
-            for a, b in zip(p[:-1], p[1:]):
-                row_indices.append(idx[a])
-                col_indices.append(idx[b])
-                data.append(1)
-        
-        T = csr_matrix((data, (row_indices, col_indices)), shape=(n, n), dtype=np.float32)
-        
-        # 归一化
-        row_sums = T.sum(axis=1).A1
-        T = T.multiply(1.0 / row_sums[:, np.newaxis])
-        
+        T = csr_matrix(counts)
+
+        # 归一化：行和倒数按 indptr 展开后直接乘在 data 上，O(nnz) 原地缩放
+        row_sums = np.asarray(T.sum(axis=1)).ravel()
+        row_sums[row_sums == 0] = 1.0
+        T.data *= np.repeat(1.0 / row_sums, np.diff(T.indptr))
+
     else:
-        # 使用密集矩阵
-        T = np.zeros((n, n), dtype=np.float32)
-        
-        # 计算转移次数
-        for p in paths:
-            for a, b in zip(p[:-1], p[1:]):
-                T[idx[a], idx[b]] += 1
-        
-        # 归一化
-        row_sum = T.sum(axis=1, keepdims=True)
-        T = np.divide(T, row_sum, out=np.zeros_like(T), where=row_sum != 0)
-    
+        # 使用密集矩阵并归一化：乘行和倒数代替掩码除法
+        row_sum = counts.sum(axis=1, keepdims=True)
+        inv = np.zeros_like(row_sum)
+        np.divide(1.0, row_sum, out=inv, where=row_sum != 0)
+        counts *= inv
+        T = counts
+
     return T, idx, states
 
 def safe_matrix_inverse(matrix, method='default'):
@@ -177,122 +453,328 @@ def safe_matrix_inverse(matrix, method='default'):
             logger.error("无法处理奇异矩阵")
             return None
 
-def removal_effect_optimized(paths, test_nodes, use_sparse=False):
-    """
-    优化的移除效应计算
-    
-    Args:
-        paths: 路径列表
-        test_nodes: 测试节点列表
-        use_sparse: 是否使用稀疏矩阵
-    
-    Returns:
-        移除效应结果列表
+_baseline_cache = {}
+
+def _markov_baseline(paths, use_sparse):
+    """构建转移矩阵并完成基准分解，跨调用缓存一份
+
+    同一份路径常被不同候选节点集合反复求效应（各图表变体只取一部分
+    节点），基准的 T/Q/R/N/w 只需分解一次。以路径对象 id + 稀疏开关
+    为键（与流水线路径缓存同一约定），缓存持有路径引用保证 id 在
+    命中期间有效，只保留最近一份。无效输入返回 None。
     """
-    if not paths:
-        logger.warning("路径列表为空")
-        return []
-    
-    # 创建转移矩阵
-    T, idx, states = create_transition_matrix(paths, use_sparse)
-    
-    # 定义吸收状态
-    absorb = ["Conversion", "Null"]
+    key = (id(paths), use_sparse)
+    entry = _baseline_cache.get("entry")
+    if entry is not None and entry[0] == key:
+        return entry[2]
+    sol = _markov_baseline_impl(paths, use_sparse)
+    _baseline_cache["entry"] = (key, paths, sol)
+    return sol
+
+def _markov_baseline_impl(paths, use_sparse):
+    # SoA 路径（build_paths_soa 的四元组）直接走 bincount 计数，
+    # 字符串路径列表保持原有流程
+    if isinstance(paths, tuple):
+        T, idx, states = transition_matrix_from_soa(paths, use_sparse)
+        if not states:
+            logger.warning("路径列表为空")
+            return None
+    else:
+        if not paths:
+            logger.warning("路径列表为空")
+            return None
+        T, idx, states = create_transition_matrix(paths, use_sparse)
+
+    # 定义吸收状态（全量转化时 Null 可能不存在，只取数据里出现的）
+    absorb = [s for s in ("Conversion", "Null") if s in idx]
     trans = [s for s in states if s not in absorb]
-    
+
     if not trans:
         logger.warning("没有过渡状态")
-        return []
-    
+        return None
+    if "Conversion" not in idx:
+        logger.warning("未找到Conversion状态")
+        return None
+
     # 提取子矩阵
     trans_indices = [idx[s] for s in trans]
     absorb_indices = [idx[s] for s in absorb]
-    
+
     if use_sparse and DATA_CONFIG['USE_SPARSE_MATRIX']:
-        Q = T[trans_indices][:, trans_indices]
-        R = T[trans_indices][:, absorb_indices]
+        # 大矩阵保持稀疏，切出的 Q/R 子块只有几十阶，转稠密直接走 LAPACK
+        Q = T[trans_indices][:, trans_indices].toarray()
+        R = T[trans_indices][:, absorb_indices].toarray()
     else:
         Q = T[np.ix_(trans_indices, trans_indices)]
         R = T[np.ix_(trans_indices, absorb_indices)]
-    
-    # 计算基准转化概率
-    N = safe_matrix_inverse(np.eye(len(Q)) - Q, ERROR_CONFIG['SINGULAR_MATRIX_HANDLING'])
-    if N is None:
-        return []
-    
+
+    # 计算基准转化概率：solve 走一次 LU 分解，比显式 inv 少一轮回代且更稳定；
+    # 奇异时按配置回退到 safe_matrix_inverse 的处理策略
+    try:
+        N = np.linalg.solve(np.eye(len(Q)) - Q, np.eye(len(Q)))
+    except np.linalg.LinAlgError:
+        N = safe_matrix_inverse(np.eye(len(Q)) - Q, ERROR_CONFIG['SINGULAR_MATRIX_HANDLING'])
+        if N is None:
+            return None
+
     v = np.zeros(len(trans))
     if "Start" in trans:
         v[trans.index("Start")] = 1
     else:
         logger.warning("未找到Start状态")
+        return None
+
+    w = v @ N
+    baseline = (w @ R)[0]
+    trans_pos = {s: i for i, s in enumerate(trans)}
+    return (T, idx, states, trans_indices, absorb_indices,
+            Q, R, N, v, w, baseline, trans_pos)
+
+def removal_effect_optimized(paths, test_nodes, use_sparse=False):
+    """
+    优化的移除效应计算
+
+    Args:
+        paths: 路径列表
+        test_nodes: 测试节点列表
+        use_sparse: 是否使用稀疏矩阵
+
+    Returns:
+        移除效应结果列表
+    """
+    sol = _markov_baseline(paths, use_sparse)
+    if sol is None:
         return []
-    
-    baseline = (v @ N @ R)[0]
-    
-    # 计算移除效应
-    results = []
-    for node in test_nodes:
-        if node not in idx:
-            logger.debug(f"节点 {node} 不在状态集中")
-            continue
-        
-        try:
-            # 创建移除后的转移矩阵
+    (T, idx, states, trans_indices, absorb_indices,
+     Q, R, N, v, w, baseline, trans_pos) = sol
+
+    scratch = {}
+    scratch_lock = threading.Lock()
+
+    def _full_recompute(node_idx):
+        """退化情形回退：整体重建移除后的转移矩阵再求一次逆"""
+        if use_sparse and DATA_CONFIG['USE_SPARSE_MATRIX']:
+            # 直接在 CSR 底层数组上清零行列（装了 numba 即为编译内核），
+            # 不走稀疏矩阵低效的花式赋值路径
             Ti = T.copy()
-            node_idx = idx[node]
-            
-            if use_sparse and DATA_CONFIG['USE_SPARSE_MATRIX']:
-                Ti[:, node_idx] = 0
-                Ti[node_idx, :] = 0
-                row_sums = Ti.sum(axis=1).A1
-                Ti = Ti.multiply(1.0 / row_sums[:, np.newaxis])
-                
-                Q2 = Ti[trans_indices][:, trans_indices]
-                R2 = Ti[trans_indices][:, absorb_indices]
-            else:
+            _zero_node_csr(Ti.data, Ti.indices, Ti.indptr, node_idx)
+            row_sums = np.asarray(Ti.sum(axis=1)).ravel()
+            row_sums[row_sums == 0] = 1.0
+            Ti.data *= np.repeat(1.0 / row_sums, np.diff(Ti.indptr))
+
+            Q2 = Ti[trans_indices][:, trans_indices].toarray()
+            R2 = Ti[trans_indices][:, absorb_indices].toarray()
+        else:
+            # 稠密缓冲只分配一次，后续回退复用同一块内存；回退路径罕见，
+            # 加锁串行化共享缓冲即可（fancy 切片出的 Q2/R2 是独立拷贝）。
+            # 清零后行和为 0 的行已全零，乘倒数 0 原地归一化不受影响
+            with scratch_lock:
+                Ti = scratch.get("dense")
+                if Ti is None:
+                    Ti = scratch["dense"] = np.empty_like(T)
+                np.copyto(Ti, T)
                 Ti[:, node_idx] = 0
                 Ti[node_idx, :] = 0
                 row_sum = Ti.sum(axis=1, keepdims=True)
-                Ti = np.divide(Ti, row_sum, out=np.zeros_like(Ti), where=row_sum != 0)
-                
+                inv = np.zeros_like(row_sum)
+                np.divide(1.0, row_sum, out=inv, where=row_sum != 0)
+                Ti *= inv
+
                 Q2 = Ti[np.ix_(trans_indices, trans_indices)]
                 R2 = Ti[np.ix_(trans_indices, absorb_indices)]
-            
+
+        # 只需要 N2 @ R2，直接解两列右端项的线性系统，不求整块逆矩阵
+        try:
+            NR2 = np.linalg.solve(np.eye(len(Q2)) - Q2, R2)
+        except np.linalg.LinAlgError:
             N2 = safe_matrix_inverse(np.eye(len(Q2)) - Q2, ERROR_CONFIG['SINGULAR_MATRIX_HANDLING'])
             if N2 is None:
-                continue
-            
-            new_conv = (v @ N2 @ R2)[0]
-            effect = round((baseline - new_conv) * 100, 2)
-            results.append((node, effect))
-            
+                return None
+            NR2 = N2 @ R2
+        return (v @ NR2)[0]
+
+    def _qr_recompute(k):
+        """过渡节点的退化回退：直接在 (Q, R) 子块上重建移除后的链
+
+        只有 k 行（清零）和指向 k 的行（除以 1 - Q[i,k] 重新归一化）
+        发生变化，其余行照抄；不再整块拷贝 n×n 的 T 重新归一化再切块。
+        子块各自拷贝，线程间不共享可写状态
+        """
+        hit = np.flatnonzero(Q[:, k])
+        hit = hit[hit != k]
+        s = 1.0 - Q[hit, k]
+        Q2 = Q.copy()
+        R2 = R.copy()
+        Q2[:, k] = 0.0
+        Q2[k, :] = 0.0
+        R2[k, :] = 0.0
+        good = s > 0
+        Q2[hit[good]] /= s[good][:, None]
+        R2[hit[good]] /= s[good][:, None]
+        # 全部概率都流向 k 的行移除后无处可去，等价于全零行
+        Q2[hit[~good]] = 0.0
+        R2[hit[~good]] = 0.0
+
+        try:
+            NR2 = np.linalg.solve(np.eye(len(Q2)) - Q2, R2)
+        except np.linalg.LinAlgError:
+            N2 = safe_matrix_inverse(np.eye(len(Q2)) - Q2, ERROR_CONFIG['SINGULAR_MATRIX_HANDLING'])
+            if N2 is None:
+                return None
+            NR2 = N2 @ R2
+        return (v @ NR2)[0]
+
+    # 计算移除效应（候选节点支持整数编号：SoA 路径场景下全程不再做字符串哈希）
+    def _effect_one(node):
+        if isinstance(node, (int, np.integer)):
+            if not 0 <= node < len(states):
+                logger.debug(f"节点编号 {node} 越界")
+                return None
+            node_idx = int(node)
+            node = states[node_idx]
+        elif node in idx:
+            node_idx = idx[node]
+        else:
+            logger.debug(f"节点 {node} 不在状态集中")
+            return None
+
+        try:
+            k = trans_pos.get(node)
+            if k is None:
+                new_conv = _full_recompute(node_idx)
+            else:
+                # 移除节点 k 即 (I - Q) 的秩 m 扰动；内核（装了 numba 即为
+                # 编译版本）对缓存的 N/w 做增量修正，不再整矩阵拷贝加重新求逆
+                try:
+                    new_conv = _woodbury_new_conv(Q, R, N, w, k)
+                except np.linalg.LinAlgError:
+                    new_conv = _qr_recompute(k)
+
+            if new_conv is None:
+                return None
+            return (node, round((baseline - new_conv) * 100, 2))
+
         except Exception as e:
             logger.error(f"计算节点 {node} 移除效应时出错: {e}")
-            continue
-    
-    return results
+            return None
+
+    # T/Q/R/N/w 已在主线程算好、各节点只读共享，矩阵代数在 LAPACK 里
+    # 释放 GIL，线程池逐节点并行求解
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        import os
+
+        with ThreadPoolExecutor(max_workers=min(os.cpu_count() or 1, 4)) as executor:
+            results = list(executor.map(_effect_one, test_nodes))
+    except ImportError:
+        results = [_effect_one(node) for node in test_nodes]
+
+    return [r for r in results if r is not None]
+
+def fused_removal_effect(paths_list, nodes_list):
+    """三个维度的移除效应融合成一次块对角稀疏求解
+
+    渠道/省份/车系共享同一套阶段拓扑，只是类别维不同：把各维度的 Q 叠成
+    block_diag 稀疏矩阵后，(I - Q) 只做一次 splu 分解即可解出全部基准
+    转化率；逐节点移除仍在各自维度的小稠密块上解线性系统。任一环节
+    退化时整体回退到逐维度的 removal_effect_optimized。
+
+    Args:
+        paths_list: build_paths_soa 四元组的列表
+        nodes_list: 各维度候选节点列表（字符串名或整数编号）
+
+    Returns:
+        与 paths_list 对齐的结果列表，每项为 (节点, 效应) 元组列表
+    """
+    try:
+        from scipy.sparse import block_diag, identity
+        from scipy.sparse.linalg import splu
+
+        absorb = ["Conversion", "Null"]
+        dims = []
+        for paths in paths_list:
+            T, idx, states = transition_matrix_from_soa(paths)
+            trans = [s for s in states if s not in absorb]
+            trans_indices = [idx[s] for s in trans]
+            absorb_indices = [idx[s] for s in absorb]
+            Q = T[np.ix_(trans_indices, trans_indices)]
+            R = T[np.ix_(trans_indices, absorb_indices)]
+            dims.append((T, idx, states, trans, trans_indices, absorb_indices, Q, R))
+
+        n_total = sum(len(d[3]) for d in dims)
+        A = identity(n_total, format="csc") - block_diag([d[6] for d in dims], format="csc")
+        NR = splu(A).solve(np.vstack([d[7] for d in dims]).astype(np.float64))
+
+        results = []
+        offset = 0
+        for dim, test_nodes in zip(dims, nodes_list):
+            T, idx, states, trans, trans_indices, absorb_indices, Q, R = dim
+            start_pos = trans.index("Start")
+            baseline = NR[offset + start_pos, 0]
+
+            effects = []
+            for node in test_nodes:
+                if isinstance(node, (int, np.integer)):
+                    if not 0 <= node < len(states):
+                        continue
+                    node_idx = int(node)
+                    node = states[node_idx]
+                elif node in idx:
+                    node_idx = idx[node]
+                else:
+                    continue
+
+                Ti = T.copy()
+                Ti[:, node_idx] = 0
+                Ti[node_idx, :] = 0
+                row_sum = Ti.sum(axis=1, keepdims=True)
+                inv = np.zeros_like(row_sum)
+                np.divide(1.0, row_sum, out=inv, where=row_sum != 0)
+                Ti *= inv
+                Q2 = Ti[np.ix_(trans_indices, trans_indices)]
+                R2 = Ti[np.ix_(trans_indices, absorb_indices)]
+                try:
+                    NR2 = np.linalg.solve(np.eye(len(Q2)) - Q2, R2)
+                except np.linalg.LinAlgError:
+                    continue
+                new_conv = NR2[start_pos, 0]
+                effects.append((node, round((baseline - new_conv) * 100, 2)))
+
+            results.append(effects)
+            offset += len(trans)
+        return results
+
+    except Exception as e:
+        logger.warning(f"融合稀疏求解失败，回退逐维度计算: {e}")
+        return [
+            removal_effect_optimized(paths, nodes, use_sparse=DATA_CONFIG['USE_SPARSE_MATRIX'])
+            for paths, nodes in zip(paths_list, nodes_list)
+        ]
 
 def parallel_removal_effect(paths_list, nodes_list, max_workers=None):
     """
     并行计算移除效应
-    
+
+    各维度的计算只读共享路径数据，矩阵代数在 BLAS/LAPACK 里释放 GIL，
+    线程池即可吃满多核，还省去进程池对整套路径数据的序列化拷贝。
+
     Args:
         paths_list: 路径列表的列表
         nodes_list: 节点列表的列表
-        max_workers: 最大工作进程数
-    
+        max_workers: 最大工作线程数
+
     Returns:
         结果列表
     """
     try:
-        from concurrent.futures import ProcessPoolExecutor
-        import multiprocessing
-        
+        from concurrent.futures import ThreadPoolExecutor
+        import os
+
         if max_workers is None:
-            max_workers = min(multiprocessing.cpu_count(), 4)
-        
+            max_workers = min(os.cpu_count() or 1, 4)
+
         results = []
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
             futures = [
                 executor.submit(removal_effect_optimized, paths, nodes)
                 for paths, nodes in zip(paths_list, nodes_list)
@@ -325,25 +807,17 @@ def validate_data_quality(df):
     Returns:
         验证结果字典
     """
-    validation_results = {
+    # 缺失值和唯一值整表一次统计，不再逐列经过 Python 层调度
+    missing = df.isna().sum()
+    obj_cols = df.select_dtypes(include=['object']).columns
+
+    return {
         'total_rows': len(df),
-        'missing_values': {},
+        'missing_values': missing[missing > 0].to_dict(),
         'duplicate_rows': df.duplicated().sum(),
         'data_types': df.dtypes.to_dict(),
-        'unique_values': {}
+        'unique_values': df[obj_cols].nunique().to_dict()
     }
-    
-    # 检查缺失值
-    for col in df.columns:
-        missing_count = df[col].isna().sum()
-        if missing_count > 0:
-            validation_results['missing_values'][col] = missing_count
-    
-    # 检查唯一值数量
-    for col in df.select_dtypes(include=['object']).columns:
-        validation_results['unique_values'][col] = df[col].nunique()
-    
-    return validation_results
 
 def log_analysis_progress(message, level='info'):
     """